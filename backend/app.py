@@ -1,16 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import os
+import math
 import uuid
 import sys
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from dotenv import load_dotenv
-from gemini_service import setup_gemini, generate_response, transcribe_audio_with_gemini
+from gemini_service import setup_gemini, transcribe_audio_with_gemini
 import json
-from classification_model import detect_emotions, detect_themes, detect_distortions, generate_summary
+from classification_model import detect_themes, detect_distortions, generate_summary, top_emotions, encode_distributions
+from inference_client import detect_emotion_distributions
+import base64
+from serialization import analysis_response
+import chat_memory
+import llm_client
+import research_export
+from emotion_store import EmotionStore, last_valid
+import click
+import observability
+import profiling
+import file_serving
+import database
+import rate_limit
+import passwords
+from user_cache import UserCache
+from observability import span
 
 
 # Load environment variables from .env file
@@ -27,7 +45,10 @@ else:
 
 # We no longer need the Qwen2 model as we'll use Gemini for audio transcription
 
-app = Flask(__name__)
+# Files are only served through explicit routes (see /profile-pictures), never from the repository
+app = Flask(__name__, static_folder=None)
+logger = observability.init_app(app, 'backend')
+profiling.init_app(app, logger)
 # We'll handle CORS manually instead of using the Flask-CORS extension
 # to avoid duplicate headers
 
@@ -107,22 +128,25 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
 # app.config['JWT_IDENTITY_CLAIM'] = 'sub'
 jwt = JWTManager(app)
 
-# Configure SQLite database with absolute path to ensure persistence
+# Configure the database: DATABASE_URL, or a local SQLite file (absolute path to ensure persistence)
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'mindful_verse.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+app.config['SQLALCHEMY_DATABASE_URI'] = database.database_uri(db_path)
+# Pool sizing, pre-ping and recycling for server databases; busy timeout for SQLite
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') # Secret key for session management
 
 # Ensure the database directory exists
 os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
-# Print the database path for debugging
-print(f"Database path: {db_path}")
+# Log the database in use for debugging
+logger.info(f"Database: {database.describe(app.config['SQLALCHEMY_DATABASE_URI'])}")
 
-# Serve static files from upload folder
-app.static_folder = os.path.join(basedir, '..')
-app.static_url_path = ''
+# Uploaded files (profile pictures and their thumbnails)
+app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', os.path.join(basedir, '..', 'uploads', 'profile_pictures'))
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+file_serving.init_app(app)
 
 db = SQLAlchemy(app)
 
@@ -137,10 +161,10 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
         
     def to_dict(self):
         return {
@@ -160,11 +184,66 @@ class Session(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class SessionAnalysis(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    session_key = db.Column(db.String(64))  # sessionMeta.sessionId returned to the client
+    patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    therapist_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    source = db.Column(db.String(20))  # 'transcript' or 'audio'
+    utterance_count = db.Column(db.Integer)
+    transcript = db.Column(db.Text)  # JSON, per-utterance speaker and labels (no text)
+    emotion_timeline = db.Column(db.Text)  # JSON
+    themes_summary = db.Column(db.Text)  # JSON
+    distortion_summary = db.Column(db.Text)  # JSON
+    emotion_scores = db.Column(db.LargeBinary)  # float16 (patient utterances x labels), see encode_distributions
+    summary = db.Column(db.Text)  # no longer written; generated summaries are not stored
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ChatMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
+    content = db.Column(db.Text, nullable=False)
+    embedding = db.Column(db.LargeBinary)  # see chat_memory.embed_text
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'role': self.role,
+            'content': self.content,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class ChatSummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    summarized_through = db.Column(db.Integer, nullable=False, default=0)  # last ChatMessage.id folded in
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # Create database tables
 with app.app_context():
     # Create all tables if they don't exist
     db.create_all()
 
+# Short-TTL cache of user records for login and per-request user lookups
+user_cache = UserCache()
+
+def user_record(user):
+    # Plain snapshot of a User that can outlive the request's database session
+    if user is None:
+        return None
+    return dict(user.to_dict(), password_hash=user.password_hash)
+
+def get_cached_user(user_id):
+    return user_cache.get_by_id(user_id, lambda uid: user_record(db.session.get(User, uid)))
+
+def get_cached_user_by_email(email):
+    return user_cache.get_by_email(email, lambda e: user_record(User.query.filter_by(email=e).first()))
+
+def public_user(record):
+    return {key: value for key, value in record.items() if key != 'password_hash'}
+
 # API Routes
 @app.route('/api/register', methods=['POST'])
 def create_user():
@@ -265,6 +344,17 @@ def create_session():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def rehash_password(user_id, password):
+    try:
+        user = db.session.get(User, user_id)
+        user.set_password(password)
+        db.session.commit()
+        user_cache.invalidate(user_id)
+    except Exception as e:
+        # The old hash still verifies, so try again on the next login
+        db.session.rollback()
+        logger.warning(f"Could not rehash password: {str(e)}")
+
 @app.route('/api/login', methods=['POST'])
 def login():
     try:
@@ -273,31 +363,35 @@ def login():
             return jsonify({'error': 'Missing email or password', 'field': None}), 400
             
         # Find user by email
-        user = User.query.filter_by(email=data['email'].lower().strip()).first()
+        user = get_cached_user_by_email(data['email'].lower().strip())
         
         # Check if user exists and password is correct
-        if user and user.check_password(data['password']):
+        if user and passwords.verify_password(user['password_hash'], data['password']):
+            # Upgrade the stored hash if PASSWORD_HASH_METHOD has changed since it was made
+            if passwords.needs_rehash(user['password_hash']):
+                rehash_password(user['id'], data['password'])
+            
             # Get the requested role (patient or therapist)
-            requested_role = data.get('role', user.role)  # Use stored role as default
+            requested_role = data.get('role', user['role'])  # Use stored role as default
             
             # Validate requested role
             if requested_role not in ['patient', 'therapist']:
-                requested_role = user.role  # Fallback to stored role if invalid
+                requested_role = user['role']  # Fallback to stored role if invalid
             
             # Create access token - convert user ID to string to ensure compatibility with JWT
-            access_token = create_access_token(identity=str(user.id))
+            access_token = create_access_token(identity=str(user['id']))
             
             # Prepare user data - use the validated role
             user_data = {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
+                'id': user['id'],
+                'username': user['username'],
+                'email': user['email'],
                 'role': requested_role
             }
             
             # Add profile picture URL if available
-            if user.profile_picture:
-                user_data['profile_picture'] = f'/profile-pictures/{user.profile_picture}'
+            if user['profile_picture']:
+                user_data['profile_picture'] = f'/profile-pictures/{user["profile_picture"]}'
                 
             return jsonify({
                 'message': 'Login successful',
@@ -308,7 +402,7 @@ def login():
             return jsonify({'error': 'Invalid email or password', 'field': None}), 401
             
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.exception(f"Login error: {str(e)}")
         return jsonify({'error': 'An error occurred during login', 'field': None}), 500
 
 @app.route('/api/user', methods=['GET'])
@@ -318,14 +412,14 @@ def get_current_user():
     user_id = get_jwt_identity()
         
     # Get user info
-    user = User.query.get(user_id)
+    user = get_cached_user(user_id)
     if user:
-        # Use the to_dict method to get consistent user representation
-        profile_data = user.to_dict()
+        # Same fields as User.to_dict
+        profile_data = public_user(user)
         
         # Add profile picture URL if available
-        if user.profile_picture:
-            profile_data['profile_picture'] = f'/profile-pictures/{user.profile_picture}'
+        if user['profile_picture']:
+            profile_data['profile_picture'] = f'/profile-pictures/{user["profile_picture"]}'
             
         return jsonify(profile_data), 200
     else:
@@ -345,7 +439,8 @@ def update_profile():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    # Get data from form
+    # Get data from form, refusing oversized bodies before they are parsed
+    file_serving.limit_request_body(file_serving.MAX_PROFILE_PICTURE_BYTES)
     data = request.form
 
     # Update username if provided
@@ -359,48 +454,58 @@ def update_profile():
             user.username = new_username
     
     # Handle profile picture upload
+    new_picture = replaced_picture = None
     if 'profile_picture' in request.files:
         file = request.files['profile_picture']
         if file and file.filename:
-            # Remove old profile picture
-            if user.profile_picture:
-                old_path = os.path.join(app.config['UPLOAD_FOLDER'], user.profile_picture)
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-            
             # Generate a unique filename
             filename = secure_filename(file.filename)
-            file_ext = os.path.splitext(filename)[1]
+            file_ext = os.path.splitext(filename)[1].lower()
             unique_filename = f"{uuid.uuid4()}{file_ext}"
             
-            # Save the file
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
+            # Stream the file to disk (size-limited) and create its thumbnails
+            try:
+                file_serving.save_profile_picture(file, app.config['UPLOAD_FOLDER'], unique_filename)
+            except file_serving.InvalidUpload as e:
+                return jsonify({'error': str(e)}), 400
+            new_picture = unique_filename
             
-            # Update user profile picture field
+            # The old picture is removed only once the new one is committed
+            replaced_picture = user.profile_picture
             user.profile_picture = unique_filename
 
     try:
         db.session.commit()
-
-        # Return updated user data
-        profile_data = {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email
-        }
-
-        # Add profile picture URL if available
-        if user.profile_picture:
-            profile_data['profile_picture'] = f'/profile-pictures/{user.profile_picture}'
-
-        return jsonify(profile_data), 200
     except Exception as e:
         db.session.rollback()
+        # The user keeps the old picture; drop the uncommitted new one
+        if new_picture:
+            file_serving.remove_profile_picture(app.config['UPLOAD_FOLDER'], new_picture)
         return jsonify({'error': str(e)}), 400
+    user_cache.invalidate(user.id)
+    if replaced_picture:
+        file_serving.remove_profile_picture(app.config['UPLOAD_FOLDER'], replaced_picture)
+
+    # Return updated user data
+    profile_data = {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email
+    }
+
+    # Add profile picture URL if available
+    if user.profile_picture:
+        profile_data['profile_picture'] = f'/profile-pictures/{user.profile_picture}'
 
+    return jsonify(profile_data), 200
 
 
+
+@app.route('/profile-pictures/<path:filename>', methods=['GET'])
+def profile_picture(filename):
+    # ?size=64 serves the smallest stored thumbnail at least that large
+    return file_serving.send_upload(app.config['UPLOAD_FOLDER'], filename, request.args.get('size', type=int))
+
 @app.route('/api/users/<int:user_id>/sessions', methods=['GET'])
 def get_user_sessions(user_id):
     sessions = Session.query.filter_by(user_id=user_id).all()
@@ -418,12 +523,140 @@ def get_user_sessions(user_id):
 def index():
     return jsonify({'message': 'Mindful Verse API is running'})
 
+def _message_dicts(rows):
+    return [{'id': r.id, 'role': r.role, 'content': r.content, 'embedding': r.embedding} for r in rows]
+
+def _unsummarized_rows(user_id, summarized_through, before_id, limit, newest=False):
+    """Up to limit messages between the summary and before_id, oldest to newest (the newest ones if newest)."""
+    query = ChatMessage.query.filter(ChatMessage.user_id == user_id,
+                                     ChatMessage.id > summarized_through,
+                                     ChatMessage.id < before_id)
+    if not newest:
+        return query.order_by(ChatMessage.id).limit(limit).all()
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit).all()
+    rows.reverse()
+    return rows
+
+def build_chat_prompt(user_id, user_message):
+    """
+    Build the prompt for the next companion reply from stored history.
+    
+    Uses the cached summary as it is; turns that have left the recent window
+    but are not in the summary yet are included verbatim (within the token
+    budget). The summary itself is updated after the reply, off the request
+    path (schedule_chat_summary).
+    """
+    recent_rows = (ChatMessage.query.filter_by(user_id=user_id)
+                   .order_by(ChatMessage.id.desc())
+                   .limit(chat_memory.CHAT_RECENT_TURNS).all())
+    recent_rows.reverse()
+    if not recent_rows:
+        return user_message
+    oldest_recent_id = recent_rows[0].id
+    
+    summary_row = db.session.get(ChatSummary, user_id)
+    summarized_through = summary_row.summarized_through if summary_row else 0
+    pending_rows = _unsummarized_rows(user_id, summarized_through, oldest_recent_id,
+                                      chat_memory.CHAT_PENDING_TURNS, newest=True)
+    
+    older_rows = (ChatMessage.query.filter(ChatMessage.user_id == user_id,
+                                           ChatMessage.id < oldest_recent_id)
+                  .order_by(ChatMessage.id.desc())
+                  .limit(chat_memory.CHAT_RETRIEVAL_WINDOW).all())
+    with span('search'):
+        return chat_memory.build_context(
+            user_message,
+            summary_row.summary if summary_row else None,
+            _message_dicts(recent_rows),
+            _message_dicts(older_rows),
+            pending_messages=_message_dicts(pending_rows),
+        )
+
+def summarize_chat_history(user_id):
+    """
+    Fold turns that have left the recent window into the cached summary once
+    CHAT_SUMMARY_TRIGGER of them have accumulated, at most
+    CHAT_SUMMARY_BATCH_TURNS at a time. Needs an app context.
+
+    Raises:
+        llm_client.LLMError: If the summary could not be generated; the cached
+            summary is left as it was
+    """
+    recent_rows = (ChatMessage.query.filter_by(user_id=user_id)
+                   .order_by(ChatMessage.id.desc())
+                   .limit(chat_memory.CHAT_RECENT_TURNS).all())
+    if not recent_rows:
+        return
+    summary_row = db.session.get(ChatSummary, user_id)
+    unsummarized = _unsummarized_rows(user_id, summary_row.summarized_through if summary_row else 0,
+                                      recent_rows[-1].id, chat_memory.CHAT_SUMMARY_BATCH_TURNS)
+    if len(unsummarized) < chat_memory.CHAT_SUMMARY_TRIGGER or not llm_client.is_configured():
+        return
+    prompt = chat_memory.build_summary_prompt(summary_row.summary if summary_row else None,
+                                              _message_dicts(unsummarized))
+    # A plain summarization call: the companion's canned fallback replies must never become the summary
+    with span('summarize'):
+        new_summary = llm_client.generate_sync(prompt, model=llm_client.GEMINI_SUMMARY_MODEL,
+                                               generation_config=chat_memory.CHAT_SUMMARY_GENERATION_CONFIG).strip()
+    if not new_summary:
+        return
+    if summary_row is None:
+        summary_row = ChatSummary(user_id=user_id)
+        db.session.add(summary_row)
+    summary_row.summary = new_summary
+    summary_row.summarized_through = unsummarized[-1].id
+    db.session.commit()
+
+# Chat summaries are generated after the reply has been sent, at most one per user at a time
+_summary_executor = ThreadPoolExecutor(max_workers=chat_memory.CHAT_SUMMARY_WORKERS, thread_name_prefix='chat-summary')
+_summaries_in_flight = set()
+_summaries_lock = threading.Lock()
+
+def _run_chat_summary(user_id):
+    try:
+        with app.app_context():
+            summarize_chat_history(user_id)
+    except Exception as e:
+        logger.warning(f"Could not update chat summary: {str(e)}")
+    finally:
+        with _summaries_lock:
+            _summaries_in_flight.discard(user_id)
+
+def schedule_chat_summary(user_id):
+    """Update the user's chat summary in the background if it is due."""
+    user_id = int(user_id)
+    with _summaries_lock:
+        if user_id in _summaries_in_flight:
+            return
+        _summaries_in_flight.add(user_id)
+    _summary_executor.submit(_run_chat_summary, user_id)
+
+def generate_companion_reply(prompt):
+    """
+    The companion's reply to a prompt from build_chat_prompt, or None if the
+    model could not be reached (the caller sends COMPANION_FALLBACK_RESPONSE).
+    The ASGI chat does the same with the async client.
+    """
+    try:
+        return llm_client.generate_sync(prompt, system_instruction=chat_memory.COMPANION_SYSTEM_PROMPT)
+    except llm_client.LLMError as e:
+        logger.warning(f"Chat reply failed, sending the fallback: {str(e)}")
+        return None
+
+def store_chat_turns(user_id, user_message, response):
+    db.session.add(ChatMessage(user_id=user_id, role='user', content=user_message,
+                               embedding=chat_memory.embedding_to_bytes(chat_memory.embed_text(user_message))))
+    if response:
+        db.session.add(ChatMessage(user_id=user_id, role='assistant', content=response,
+                                   embedding=chat_memory.embedding_to_bytes(chat_memory.embed_text(response))))
+    db.session.commit()
+
 @app.route('/api/chat', methods=['POST'])
 @jwt_required()
+@rate_limit.limit('chat')
 def chat():
     try:
-        # Check if Gemini models are properly initialized
-        if gemini_models is None:
+        if not llm_client.is_configured():
             return jsonify({'error': 'AI service is not properly configured. Please check your API key.'}), 500
             
         data = request.get_json()
@@ -431,23 +664,51 @@ def chat():
             return jsonify({'error': 'Missing message field'}), 400
             
         user_message = data['message']
-        print(f"Processing chat request with message: {user_message}")
         
         # Get user ID from JWT token
         user_id = get_jwt_identity()
-        # No need to convert to string as it should already be handled correctly
-        print(f"User ID from token: {user_id}")
+        # Only log sizes - chat messages are sensitive and can be long
+        logger.debug('chat request', extra={'user_id': user_id, 'message_chars': len(user_message)})
         
-        # Generate response using Gemini
-        response = generate_response(user_message, gemini_models)
-        print(f"Generated response: {response[:50]}..." if response and len(response) > 50 else f"Generated response: {response}")
+        # Build the prompt from stored history, then generate using Gemini
+        prompt = build_chat_prompt(user_id, user_message)
+        with span('generate'):
+            response = generate_companion_reply(prompt)
+        
+        # Store both turns so later messages have context
+        store_chat_turns(user_id, user_message, response)
+        schedule_chat_summary(user_id)
         
         return jsonify({
-            'response': response
+            'response': response or chat_memory.COMPANION_FALLBACK_RESPONSE
         }), 200
         
     except Exception as e:
-        print(f"Chat API error: {str(e)}")
+        db.session.rollback()
+        logger.exception(f"Chat API error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/chat/history', methods=['GET'])
+@jwt_required()
+def get_chat_history():
+    user_id = get_jwt_identity()
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    messages = (ChatMessage.query.filter_by(user_id=user_id)
+                .order_by(ChatMessage.id.desc())
+                .limit(limit).all())
+    return jsonify([message.to_dict() for message in reversed(messages)]), 200
+
+@app.route('/api/chat/history', methods=['DELETE'])
+@jwt_required()
+def clear_chat_history():
+    try:
+        user_id = get_jwt_identity()
+        ChatMessage.query.filter_by(user_id=user_id).delete()
+        ChatSummary.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+        return jsonify({'message': 'Chat history cleared'}), 200
+    except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/session-dashboard', methods=['GET', 'POST'])
@@ -475,12 +736,18 @@ def get_session_dashboard():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def analyze_transcript_with_classification_model(structured_transcript):
+SUMMARY_FAILED_MESSAGE = "Summary generation failed. Please check the Gemini API key and try again."
+
+def analyze_transcript_with_classification_model(structured_transcript, include_distributions=False, summarize=True):
     """
     Analyze a transcript using the classification model to detect emotions, themes, and distortions
     
     Args:
         structured_transcript: List of dictionaries with 'speaker' and 'utterance' fields
+        include_distributions: Also return the full emotion distribution of every patient
+            utterance as a compact float16 array ("emotionDistributions")
+        summarize: Generate the session summary with Gemini. When False the summary is
+            left as None for the caller to fill in (the ASGI app generates it concurrently)
     
     Returns:
         Analysis results including emotions, themes, and distortions
@@ -500,6 +767,11 @@ def analyze_transcript_with_classification_model(structured_transcript):
         themes_summary = defaultdict(int)
         distortion_summary = defaultdict(int)
         
+        # Run emotion detection for all patient utterances in one batch
+        with span('classify'):
+            distributions = detect_emotion_distributions([entry['utterance'] for entry in patient_utterances])
+        patient_emotions = iter([top_emotions(row) for row in distributions])
+        
         # Process each utterance
         patient_idx = 0
         transcript_with_analysis = []
@@ -521,7 +793,7 @@ def analyze_transcript_with_classification_model(structured_transcript):
             # Only analyze patient utterances in depth
             if speaker == 'patient':
                 # Detect emotions
-                emotions = detect_emotions(utterance)
+                emotions = next(patient_emotions)
                 analyzed_entry["emotions"] = [{"label": emotion, "score": score} for emotion, score in emotions]
                 
                 for emotion, score in emotions:
@@ -552,13 +824,14 @@ def analyze_transcript_with_classification_model(structured_transcript):
             })
         
         # Generate a summary from the transcript using Gemini
-        try:
-            print("Generating summary using Gemini...")
-            summary = generate_summary(structured_transcript)
-            print(f"Summary generated successfully: {summary[:50]}...")
-        except Exception as summary_error:
-            print(f"Error generating summary: {str(summary_error)}")
-            summary = "Summary generation failed. Please check the Gemini API key and try again."
+        summary = None
+        if summarize:
+            try:
+                with span('summarize'):
+                    summary = generate_summary(structured_transcript)
+            except Exception as summary_error:
+                logger.warning(f"Error generating summary: {str(summary_error)}")
+                summary = SUMMARY_FAILED_MESSAGE
         
         # Prepare the analysis result in the format expected by TherapistSessions component
         analysis_result = {
@@ -573,22 +846,87 @@ def analyze_transcript_with_classification_model(structured_transcript):
             "themesSummary": dict(themes_summary),
             "distortionSummary": dict(distortion_summary)
         }
+        if include_distributions:
+            analysis_result["emotionDistributions"] = encode_distributions(distributions)
         
         return analysis_result
     except Exception as e:
-        print(f"Error in analyze_transcript_with_classification_model: {str(e)}")
+        logger.exception(f"Error in analyze_transcript_with_classification_model: {str(e)}")
         return {"error": f"Failed to analyze transcript: {str(e)}"}
 
+def _optional_user_id():
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        return int(identity) if identity is not None else None
+    except Exception:
+        return None
+
+def _requested_patient_id(data):
+    try:
+        return int(data.get('patientId')) if data and data.get('patientId') is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _wants_distributions(data):
+    return bool((data and data.get('includeDistributions')) or request.args.get('distributions') in ('1', 'true'))
+
+def _stored_utterances(transcript):
+    # Per-utterance labels only; the utterance text is never stored
+    return [{key: entry.get(key) for key in ('index', 'speaker', 'emotions', 'themes', 'distortions')}
+            for entry in transcript]
+
+def store_analysis(analysis_result, source, patient_id=None, therapist_id=None):
+    """
+    Persist the derived fields of an analysis (labels, emotion timeline and
+    scores, theme/distortion counts) for research export and cohort analytics.
+    
+    Only analyses requested by an authenticated therapist are stored, and
+    patient_id is kept only if it is the numeric ID of a registered patient
+    (the cohort queries need it). Utterance text and the generated summary are
+    not stored. Never raises.
+    """
+    try:
+        therapist = get_cached_user(therapist_id) if therapist_id is not None else None
+        if not therapist or therapist['role'] != 'therapist':
+            return None
+        patient = get_cached_user(patient_id) if patient_id is not None else None
+        patient_id = patient['id'] if patient and patient['role'] == 'patient' else None
+        
+        distributions = analysis_result.get('emotionDistributions')
+        if patient_id is not None:
+            analysis_result['sessionMeta']['patientId'] = str(patient_id)
+        record = SessionAnalysis(
+            session_key=analysis_result['sessionMeta']['sessionId'],
+            patient_id=patient_id,
+            therapist_id=therapist['id'],
+            source=source,
+            utterance_count=len(analysis_result['transcript']),
+            transcript=json.dumps(_stored_utterances(analysis_result['transcript'])),
+            emotion_timeline=json.dumps(analysis_result['emotionTimeline']),
+            themes_summary=json.dumps(analysis_result['themesSummary']),
+            distortion_summary=json.dumps(analysis_result['distortionSummary']),
+            emotion_scores=base64.b64decode(distributions['data']) if distributions else None
+        )
+        db.session.add(record)
+        db.session.commit()
+        return record
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not store analysis: {str(e)}")
+        return None
+
 @app.route('/api/transcribe-audio', methods=['POST'])
+@rate_limit.limit('transcribe')
 def transcribe_audio_endpoint():
     try:
-        data = request.get_json()
+        with span('decode'):
+            data = request.get_json()
         
         if not data or 'audio' not in data:
             return jsonify({'error': 'No audio data provided'}), 400
         
-        # Log that we received audio data
-        print(f"Received audio data, length: {len(data['audio']) if 'audio' in data else 'unknown'}")
+        logger.debug('transcription request', extra={'audio_chars': len(data['audio'])})
         
         # Check if Gemini models are available
         if gemini_models is None:
@@ -596,17 +934,24 @@ def transcribe_audio_endpoint():
             
         # Transcribe the audio using Gemini 1.5 Pro
         audio_data = data['audio']
-        transcription_result = transcribe_audio_with_gemini(audio_data, gemini_models)
+        with span('transcribe'):
+            transcription_result = transcribe_audio_with_gemini(audio_data, gemini_models)
         
         if 'error' in transcription_result:
-            print(f"Error in transcription: {transcription_result['error']}")
+            logger.warning(f"Error in transcription: {transcription_result['error']}")
             return jsonify({'error': transcription_result['error']}), 500
         
         # Get the structured transcript for analysis
         structured_transcript = transcription_result.get('structured_transcript', [])
         
         # Analyze the transcript using the classification model
-        analysis_result = analyze_transcript_with_classification_model(structured_transcript)
+        # Distributions are always computed so they can be stored; they are only
+        # returned when the client asks for them
+        analysis_result = analyze_transcript_with_classification_model(structured_transcript, include_distributions=True)
+        if 'error' not in analysis_result:
+            store_analysis(analysis_result, 'audio', _requested_patient_id(data), _optional_user_id())
+            if not _wants_distributions(data):
+                analysis_result.pop('emotionDistributions', None)
         
         # We need to ensure the structured_transcript field is included in the response
         # as the VoiceRecorder component specifically checks for this field
@@ -616,16 +961,60 @@ def transcribe_audio_endpoint():
         if 'transcription' in transcription_result and 'transcription' not in analysis_result:
             analysis_result['transcription'] = transcription_result['transcription']
         
-        # Log successful transcription and analysis
-        print(f"Transcription and analysis successful, returning result")
-        print(f"Response includes structured_transcript: {structured_transcript is not None}")
-        return jsonify(analysis_result), 200
+        with span('serialize'):
+            return analysis_response(analysis_result)
         
     except Exception as e:
-        print(f"Exception in transcribe_audio_endpoint: {str(e)}")
+        logger.exception(f"Exception in transcribe_audio_endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def parse_transcript(transcript_data):
+    """
+    Accept a structured transcript as-is, or convert a plain text one.
+    
+    Args:
+        transcript_data: List of {'speaker', 'utterance'} dictionaries, or text with one
+            utterance per line, optionally prefixed with "Therapist:" / "Patient:"
+    
+    Returns:
+        List of dictionaries with 'speaker' and 'utterance' fields
+    """
+    # Check if the transcript is already in structured format
+    if isinstance(transcript_data, list) and all(isinstance(item, dict) and 'speaker' in item and 'utterance' in item for item in transcript_data):
+        return transcript_data
+    
+    # Try to convert plain text transcript to structured format
+    lines = transcript_data.strip().split('\n')
+    structured_transcript = []
+    is_therapist = True  # Start with therapist by default
+    
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+            
+        # Check if line starts with speaker label
+        if line.lower().startswith('therapist:'):
+            utterance = line[len('therapist:'):].strip()
+            structured_transcript.append({"speaker": "therapist", "utterance": utterance})
+            is_therapist = False  # Next speaker is patient
+        elif line.lower().startswith('patient:'):
+            utterance = line[len('patient:'):].strip()
+            structured_transcript.append({"speaker": "patient", "utterance": utterance})
+            is_therapist = True  # Next speaker is therapist
+        else:
+            # No speaker label, use alternating speakers
+            speaker = "therapist" if is_therapist else "patient"
+            structured_transcript.append({"speaker": speaker, "utterance": line})
+            is_therapist = not is_therapist  # Toggle speaker
+    return structured_transcript
+
+def format_transcription(structured_transcript):
+    # Full transcription text with speaker labels
+    return "\n".join([f"{item['speaker'].capitalize()}: {item['utterance']}" for item in structured_transcript])
+
 @app.route('/api/analyze-transcript', methods=['POST'])
+@rate_limit.limit('analyze')
 def analyze_transcript():
     try:
         data = request.get_json()
@@ -634,57 +1023,156 @@ def analyze_transcript():
             return jsonify({'error': 'No transcript data provided'}), 400
         
         # Get the transcript data
-        transcript_data = data['transcript']
-        
-        # Check if the transcript is already in structured format
-        if isinstance(transcript_data, list) and all(isinstance(item, dict) and 'speaker' in item and 'utterance' in item for item in transcript_data):
-            structured_transcript = transcript_data
-        else:
-            # Try to convert plain text transcript to structured format
-            try:
-                lines = transcript_data.strip().split('\n')
-                structured_transcript = []
-                is_therapist = True  # Start with therapist by default
-                
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                        
-                    # Check if line starts with speaker label
-                    if line.lower().startswith('therapist:'):
-                        utterance = line[len('therapist:'):].strip()
-                        structured_transcript.append({"speaker": "therapist", "utterance": utterance})
-                        is_therapist = False  # Next speaker is patient
-                    elif line.lower().startswith('patient:'):
-                        utterance = line[len('patient:'):].strip()
-                        structured_transcript.append({"speaker": "patient", "utterance": utterance})
-                        is_therapist = True  # Next speaker is therapist
-                    else:
-                        # No speaker label, use alternating speakers
-                        speaker = "therapist" if is_therapist else "patient"
-                        structured_transcript.append({"speaker": speaker, "utterance": line})
-                        is_therapist = not is_therapist  # Toggle speaker
-            except Exception as e:
-                return jsonify({'error': f'Failed to parse transcript: {str(e)}'}), 400
+        try:
+            structured_transcript = parse_transcript(data['transcript'])
+        except Exception as e:
+            return jsonify({'error': f'Failed to parse transcript: {str(e)}'}), 400
             
         # Analyze the structured transcript
-        analysis_result = analyze_transcript_with_classification_model(structured_transcript)
+        analysis_result = analyze_transcript_with_classification_model(structured_transcript, include_distributions=True)
         
         if 'error' in analysis_result:
             return jsonify({'error': analysis_result['error']}), 500
         
+        store_analysis(analysis_result, 'transcript', _requested_patient_id(data), _optional_user_id())
+        if not _wants_distributions(data):
+            analysis_result.pop('emotionDistributions', None)
+        
         # Add the raw transcription text if it's not already included
         if 'transcription' not in analysis_result:
-            # Format the full transcription with speaker labels
-            formatted_transcription = "\n".join([f"{item['speaker'].capitalize()}: {item['utterance']}" for item in structured_transcript])
-            analysis_result['transcription'] = formatted_transcription
+            analysis_result['transcription'] = format_transcription(structured_transcript)
             
-        return jsonify(analysis_result), 200
+        with span('serialize'):
+            return analysis_response(analysis_result)
         
     except Exception as e:
-        print(f"Exception in analyze_transcript: {str(e)}")
+        logger.exception(f"Exception in analyze_transcript: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/research/export', methods=['GET'])
+def export_research_data():
+    # Covers all patients of all therapists: operators only, never self-registered accounts
+    if not research_export.is_authorized(request.headers.get(research_export.EXPORT_TOKEN_HEADER)):
+        return jsonify({'error': 'Research export requires a valid X-Export-Token'}), 403
+    try:
+        key = research_export.get_export_key()
+    except research_export.ExportError as e:
         return jsonify({'error': str(e)}), 500
+    
+    records = research_export.iter_records(db, Session, SessionAnalysis, key)
+    filename = f"mindful-verse-research-{datetime.utcnow().strftime('%Y%m%d')}.ndjson.gz"
+    return Response(
+        stream_with_context(research_export.iter_ndjson_gzip(records)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+# Columnar emotion scores for cohort analytics, loaded incrementally from SessionAnalysis
+emotion_store = EmotionStore()
+
+def _analysis_rows_after(last_id):
+    return (db.session.query(SessionAnalysis.id, SessionAnalysis.patient_id, SessionAnalysis.therapist_id,
+                             SessionAnalysis.created_at, SessionAnalysis.emotion_timeline,
+                             SessionAnalysis.emotion_scores)
+            .filter(SessionAnalysis.id > last_id,
+                    SessionAnalysis.patient_id.isnot(None))
+            .order_by(SessionAnalysis.id)
+            .yield_per(1000))
+
+def refresh_emotion_store():
+    return emotion_store.refresh(_analysis_rows_after)
+
+def _current_therapist():
+    user = get_cached_user(get_jwt_identity())
+    return user if user and user['role'] == 'therapist' else None
+
+def _cohort_params():
+    emotion = request.args.get('emotion', 'sadness')
+    sessions = min(max(request.args.get('sessions', 8, type=int), 2), 100)
+    limit = min(request.args.get('limit', 50, type=int), 1000)
+    return emotion, sessions, limit
+
+def _json_float(value):
+    # NaN (e.g. no scored sessions in a window) is not valid JSON; send null instead
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+@app.route('/api/therapist/cohort/trends', methods=['GET'])
+@jwt_required()
+def get_cohort_trends():
+    therapist = _current_therapist()
+    if not therapist:
+        return jsonify({'error': 'Only therapists can view cohort analytics'}), 403
+    emotion, sessions, limit = _cohort_params()
+    min_sessions = request.args.get('min_sessions', 3, type=int)
+    window = request.args.get('window', 3, type=int)
+    try:
+        refresh_emotion_store()
+        trend = emotion_store.trend(emotion, sessions, min_sessions, therapist_id=therapist['id'])
+        ma_patients, moving_average = emotion_store.moving_average(emotion, window, sessions,
+                                                                   patient_ids=trend['patient_id'],
+                                                                   therapist_id=therapist['id'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    latest_average = dict(zip(ma_patients.tolist(), last_valid(moving_average).tolist())) if len(ma_patients) else {}
+    order = trend['slope'].argsort()[::-1][:limit]
+    return jsonify({
+        'emotion': emotion,
+        'sessions': sessions,
+        'patients': [
+            {
+                'patientId': int(trend['patient_id'][i]),
+                'slope': _json_float(trend['slope'][i]),
+                'sessions': int(trend['sessions'][i]),
+                'latest': _json_float(trend['latest'][i]),
+                'mean': _json_float(trend['mean'][i]),
+                'movingAverage': _json_float(latest_average.get(int(trend['patient_id'][i])))
+            } for i in order
+        ]
+    }), 200
+
+@app.route('/api/therapist/cohort/anomalies', methods=['GET'])
+@jwt_required()
+def get_cohort_anomalies():
+    therapist = _current_therapist()
+    if not therapist:
+        return jsonify({'error': 'Only therapists can view cohort analytics'}), 403
+    emotion, sessions, limit = _cohort_params()
+    z_threshold = request.args.get('z', 2.0, type=float)
+    try:
+        refresh_emotion_store()
+        result = emotion_store.anomalies(emotion, sessions, z_threshold, therapist_id=therapist['id'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    order = abs(result['z_score']).argsort()[::-1][:limit]
+    return jsonify({
+        'emotion': emotion,
+        'sessions': sessions,
+        'patients': [
+            {
+                'patientId': int(result['patient_id'][i]),
+                'latest': _json_float(result['latest'][i]),
+                'baseline': _json_float(result['baseline'][i]),
+                'zScore': _json_float(result['z_score'][i])
+            } for i in order
+        ]
+    }), 200
+
+@app.cli.command('export-research')
+@click.option('--output', '-o', required=True, help='Output file (ndjson) or directory (parquet)')
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'parquet']), default='ndjson')
+@click.option('--batch-size', type=int, default=research_export.EXPORT_BATCH_SIZE)
+def export_research_command(output, fmt, batch_size):
+    """Export anonymized sessions and analyses for research."""
+    try:
+        counts = research_export.export(db, Session, SessionAnalysis, output, fmt, batch_size)
+    except research_export.ExportError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Exported {counts} to {output}")
 
 # In newer Flask versions, we need to use a different approach instead of before_first_request
 # We'll create a function that will be called during app initialization
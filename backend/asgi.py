@@ -0,0 +1,229 @@
+# ASGI entry point for the backend API.
+#
+#   uvicorn asgi:app --app-dir backend --port 5001 --workers 2
+#
+# The I/O-bound endpoints (/api/chat and /api/analyze-transcript) are served by
+# async handlers. Their Gemini calls go through llm_client's shared async HTTP
+# client, so one worker can have many slow model calls in flight without a
+# thread blocked on each. CPU-bound work (emotion classification) runs on the
+# shared model thread pool (model_registry, MODEL_POOL_WORKERS), and database
+# access runs on the threadpool inside a Flask app context. Every other route is
+# served by the Flask app itself, mounted unchanged through WSGIMiddleware.
+# Both async endpoints keep the Flask routes' rate limits (rate_limit).
+#
+# Requires starlette, uvicorn and httpx (a2wsgi is used when installed).
+import asyncio
+from contextlib import asynccontextmanager
+import os
+import sys
+from functools import partial
+
+# Shared helpers (llm_client, ...) live at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask_jwt_extended import decode_token
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as flask_backend
+import chat_memory
+import llm_client
+import model_registry
+import rate_limit
+import serialization
+from classification_model import SUMMARY_GENERATION_CONFIG, build_summary_prompt
+
+logger = flask_backend.logger
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run CPU-bound work (model inference) on the shared model thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(model_registry.executor(), partial(fn, *args, **kwargs))
+
+
+def _with_app_context(fn, *args):
+    with flask_backend.app.app_context():
+        return fn(*args)
+
+
+async def run_db(fn, *args):
+    """Run a function that uses Flask-SQLAlchemy on the threadpool inside an app context."""
+    return await run_in_threadpool(_with_app_context, fn, *args)
+
+
+def jwt_identity(request, optional=False):
+    """
+    Decode the bearer token with the Flask app's JWT settings.
+
+    Returns:
+        The identity (user ID string), or None if optional and no valid token was sent
+    """
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else None
+    if token:
+        try:
+            with flask_backend.app.app_context():
+                return decode_token(token)[flask_backend.app.config.get('JWT_IDENTITY_CLAIM', 'sub')]
+        except Exception:
+            if not optional:
+                raise PermissionError('Invalid or expired token')
+            return None
+    if not optional:
+        raise PermissionError('Missing Authorization Header')
+    return None
+
+
+def client_key(request):
+    """Rate-limit key: the JWT user when a valid token was sent, else the client address."""
+    user_id = jwt_identity(request, optional=True)
+    return f"user:{user_id}" if user_id is not None else f"ip:{request.client.host if request.client else None}"
+
+
+def rejection_response(body, status, headers):
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def limit(name):
+    return rate_limit.limit_async(name, client_key, rejection_response)
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def generate_companion_reply(prompt):
+    """Async flask_backend.generate_companion_reply: same instructions, same fallback."""
+    try:
+        return await llm_client.generate(prompt, system_instruction=chat_memory.COMPANION_SYSTEM_PROMPT)
+    except llm_client.LLMError as e:
+        logger.warning(f"Chat reply failed, sending the fallback: {str(e)}")
+        return None
+
+
+@limit('chat')
+async def chat(request: Request):
+    try:
+        user_id = jwt_identity(request)
+    except PermissionError as e:
+        return JSONResponse({'msg': str(e)}, status_code=401)
+    if not llm_client.is_configured():
+        return JSONResponse({'error': 'AI service is not properly configured. Please check your API key.'}, status_code=500)
+
+    data = await read_json(request)
+    if not data or 'message' not in data:
+        return JSONResponse({'error': 'Missing message field'}, status_code=400)
+    user_message = data['message']
+    logger.debug('chat request', extra={'user_id': user_id, 'message_chars': len(user_message)})
+
+    try:
+        prompt = await run_db(flask_backend.build_chat_prompt, user_id, user_message)
+        response = await generate_companion_reply(prompt)
+        await run_db(flask_backend.store_chat_turns, user_id, user_message, response)
+        flask_backend.schedule_chat_summary(user_id)
+        return JSONResponse({'response': response or chat_memory.COMPANION_FALLBACK_RESPONSE})
+    except Exception as e:
+        logger.exception(f"Chat API error: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def generate_summary(structured_transcript):
+    try:
+        return await llm_client.generate(build_summary_prompt(structured_transcript),
+                                         model=llm_client.GEMINI_SUMMARY_MODEL,
+                                         generation_config=SUMMARY_GENERATION_CONFIG)
+    except llm_client.LLMError as e:
+        logger.warning(f"Error generating summary: {str(e)}")
+        return flask_backend.SUMMARY_FAILED_MESSAGE
+
+
+def analysis_response(request, payload):
+    body, mimetype, encoding = serialization.encode_analysis(
+        payload,
+        columnar=(request.query_params.get('format') == 'compact'
+                  or request.headers.get('X-Response-Format', '').lower() == 'compact'),
+        msgpack_accepted=serialization.msgpack_acceptable(request.headers.get('Accept')),
+        gzip_accepted=serialization.gzip_acceptable(request.headers.get('Accept-Encoding')),
+    )
+    headers = {'Vary': ', '.join(serialization.VARY_HEADERS)}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type=mimetype, headers=headers)
+
+
+@limit('analyze')
+async def analyze_transcript(request: Request):
+    data = await read_json(request)
+    if not data or 'transcript' not in data:
+        return JSONResponse({'error': 'No transcript data provided'}, status_code=400)
+    try:
+        structured_transcript = flask_backend.parse_transcript(data['transcript'])
+    except Exception as e:
+        return JSONResponse({'error': f'Failed to parse transcript: {str(e)}'}, status_code=400)
+
+    try:
+        # The summary is generated while the transcript is being classified
+        summary_task = asyncio.create_task(generate_summary(structured_transcript))
+        try:
+            analysis_result = await run_cpu(flask_backend.analyze_transcript_with_classification_model,
+                                            structured_transcript, include_distributions=True, summarize=False)
+            summary = await summary_task
+        finally:
+            # Don't leave the Gemini call running if classification failed
+            summary_task.cancel()
+        if 'error' in analysis_result:
+            return JSONResponse({'error': analysis_result['error']}, status_code=500)
+        analysis_result['sessionMeta']['summary'] = summary
+
+        therapist_id = jwt_identity(request, optional=True)
+        await run_db(flask_backend.store_analysis, analysis_result, 'transcript',
+                     flask_backend._requested_patient_id(data),
+                     int(therapist_id) if therapist_id is not None else None)
+        if not (data.get('includeDistributions') or request.query_params.get('distributions') in ('1', 'true')):
+            analysis_result.pop('emotionDistributions', None)
+        if 'transcription' not in analysis_result:
+            analysis_result['transcription'] = flask_backend.format_transcription(structured_transcript)
+        return await run_cpu(analysis_response, request, analysis_result)
+    except Exception as e:
+        logger.exception(f"Exception in analyze_transcript: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await llm_client.close()
+
+
+def create_app(flask_app=flask_backend.app):
+    return Starlette(
+        routes=[
+            Route('/api/chat', chat, methods=['POST']),
+            Route('/api/analyze-transcript', analyze_transcript, methods=['POST']),
+            Mount('/', app=WSGIMiddleware(flask_app)),
+        ],
+        # Same policy as the Flask app: echo the caller's origin, allow credentials
+        middleware=[Middleware(CORSMiddleware, allow_origin_regex='.*', allow_credentials=True,
+                               allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+                               allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'])],
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=5001)
@@ -0,0 +1,211 @@
+# Context building for the chat companion.
+#
+# Conversations are stored server-side (ChatMessage / ChatSummary in app.py).
+# For each new message the prompt is assembled from, in order of priority:
+#   1. the most recent turns, verbatim
+#   2. a running summary of older turns (regenerated in the background after
+#      a reply once enough new turns have aged out of the recent window, then
+#      cached in the database)
+#   3. turns that have left the recent window but are not in the summary yet,
+#      verbatim, so nothing drops out while a summary is pending
+#   4. a few older turns that are similar to the new message
+# all within a fixed token budget, so prompt size and latency stay flat no
+# matter how long the conversation gets.
+#
+# Similarity uses hashed bag-of-words vectors rather than a neural embedding
+# model so the backend doesn't need to load a second model for this.
+import hashlib
+import math
+import os
+import re
+
+import numpy as np
+
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '1500'))
+CHAT_RECENT_TURNS = int(os.getenv('CHAT_RECENT_TURNS', '8'))
+CHAT_RETRIEVED_TURNS = int(os.getenv('CHAT_RETRIEVED_TURNS', '3'))
+CHAT_RETRIEVAL_WINDOW = int(os.getenv('CHAT_RETRIEVAL_WINDOW', '500'))
+CHAT_SUMMARY_TRIGGER = int(os.getenv('CHAT_SUMMARY_TRIGGER', '6'))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', '300'))
+# Most turns folded into the summary per update, so the summary prompt stays bounded
+CHAT_SUMMARY_BATCH_TURNS = int(os.getenv('CHAT_SUMMARY_BATCH_TURNS', '40'))
+# Unsummarized turns loaded per prompt; at ~10 tokens for a short turn, more than
+# this cannot fit in the budget anyway
+CHAT_PENDING_TURNS = int(os.getenv('CHAT_PENDING_TURNS', str(CHAT_CONTEXT_TOKEN_BUDGET // 10)))
+CHAT_SUMMARY_WORKERS = int(os.getenv('CHAT_SUMMARY_WORKERS', '2'))  # background summary threads per process
+
+# Sent as the system instruction with every companion reply, by the Flask and the
+# ASGI chat alike, so the answer does not depend on which server handled it
+COMPANION_SYSTEM_PROMPT = """
+You are Mindful Verse, a supportive mental health companion. Respond with warmth and empathy,
+reflect what the patient shares, and keep replies concise and conversational. Offer gentle,
+practical coping ideas when they fit, but do not diagnose or prescribe. If the patient mentions
+self-harm or being in danger, encourage them to contact local emergency services or a crisis line
+right away.
+""".strip()
+# Shown when no reply could be generated; never stored as a companion turn
+COMPANION_FALLBACK_RESPONSE = "I'm having trouble responding right now. Please try again in a moment."
+
+EMBEDDING_DIM = 256
+MIN_RETRIEVAL_SIMILARITY = 0.2
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def estimate_tokens(text):
+    # Roughly 4 characters per token for English text
+    return max(1, math.ceil(len(text) / 4))
+
+
+def embed_text(text):
+    """Hashed bag-of-words vector (unit length, float32)."""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest()
+        bucket = int.from_bytes(digest, 'little')
+        vector[bucket % EMBEDDING_DIM] += 1.0 if bucket & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def embedding_to_bytes(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def embedding_from_bytes(data):
+    return np.frombuffer(data, dtype=np.float32)
+
+
+def select_recent(messages, budget, max_turns=CHAT_RECENT_TURNS):
+    """
+    Pick the newest messages that fit in budget tokens.
+
+    Args:
+        messages: Messages ordered oldest to newest, each with 'content'
+        budget: Token budget for the recent window
+
+    Returns:
+        (selected messages oldest to newest, tokens used)
+    """
+    selected = []
+    used = 0
+    for message in reversed(messages[-max_turns:]):
+        cost = estimate_tokens(message['content'])
+        if used + cost > budget:
+            break
+        selected.append(message)
+        used += cost
+    selected.reverse()
+    return selected, used
+
+
+def retrieve_relevant(query, candidates, budget, k=CHAT_RETRIEVED_TURNS):
+    """
+    Pick up to k older messages most similar to query that fit in budget.
+
+    Args:
+        query: The new user message
+        candidates: Older messages, each with 'content' and 'embedding' (bytes)
+        budget: Token budget for retrieved turns
+
+    Returns:
+        (selected messages in chronological order, tokens used)
+    """
+    candidates = [c for c in candidates if c.get('embedding')]
+    if not candidates or k <= 0:
+        return [], 0
+    matrix = np.vstack([embedding_from_bytes(c['embedding']) for c in candidates])
+    scores = matrix @ embed_text(query)
+    selected = []
+    used = 0
+    for i in np.argsort(-scores):
+        if len(selected) >= k or scores[i] < MIN_RETRIEVAL_SIMILARITY:
+            break
+        cost = estimate_tokens(candidates[i]['content'])
+        if used + cost > budget:
+            continue
+        selected.append(candidates[i])
+        used += cost
+    selected.sort(key=lambda c: c['id'])
+    return selected, used
+
+
+def _format_turns(messages):
+    return "\n".join(f"{'Patient' if m['role'] == 'user' else 'Companion'}: {m['content']}" for m in messages)
+
+
+CHAT_SUMMARY_GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "maxOutputTokens": CHAT_SUMMARY_MAX_TOKENS,
+}
+
+
+def build_summary_prompt(previous_summary, messages):
+    return f"""
+Update the running summary of a conversation between a patient and their mental health companion.
+Keep it under {CHAT_SUMMARY_MAX_TOKENS * 3 // 4} words. Keep facts the patient shared about themselves,
+their feelings, goals and anything the companion suggested. Drop small talk.
+
+Current summary:
+{previous_summary or '(none yet)'}
+
+New turns to fold in:
+{_format_turns(messages)}
+
+Updated summary:
+""".strip()
+
+
+def build_prompt(message, summary, retrieved, recent):
+    """Assemble the text sent with COMPANION_SYSTEM_PROMPT for the next reply."""
+    sections = []
+    if summary:
+        sections.append(f"Summary of the earlier conversation:\n{summary}")
+    if retrieved:
+        sections.append(f"Earlier turns that may be relevant:\n{_format_turns(retrieved)}")
+    if recent:
+        sections.append(f"Most recent turns:\n{_format_turns(recent)}")
+    if not sections:
+        return message
+    sections.append(f"The patient now says:\n{message}")
+    return "\n\n".join(sections)
+
+
+def build_context(message, summary, recent_messages, older_messages, budget=CHAT_CONTEXT_TOKEN_BUDGET,
+                  pending_messages=()):
+    """
+    Build a token-budgeted prompt for the next companion reply.
+
+    The new message is always included; the summary comes next, then recent
+    turns and turns not yet folded into the summary (newest first), then
+    retrieved older turns with whatever budget remains.
+
+    Args:
+        message: The new user message
+        summary: Cached summary of turns older than the recent window (or None)
+        recent_messages: Latest messages, oldest to newest
+        older_messages: Candidate messages for retrieval, outside the recent window
+        budget: Total token budget for the prompt
+        pending_messages: Messages between the summary and the recent window,
+            oldest to newest
+
+    Returns:
+        The prompt string
+    """
+    remaining = budget - estimate_tokens(message)
+    if summary:
+        summary_cost = estimate_tokens(summary)
+        if summary_cost > remaining:
+            summary = None
+        else:
+            remaining -= summary_cost
+    pending_messages = list(pending_messages)
+    recent, used = select_recent(pending_messages + list(recent_messages), max(remaining, 0),
+                                 max_turns=len(pending_messages) + CHAT_RECENT_TURNS)
+    remaining -= used
+    recent_ids = {m['id'] for m in recent}
+    retrieved, _ = retrieve_relevant(message, [m for m in older_messages if m['id'] not in recent_ids],
+                                     max(remaining, 0))
+    return build_prompt(message, summary, retrieved, recent)
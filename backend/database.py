@@ -0,0 +1,71 @@
+# SQLAlchemy engine configuration.
+#
+# - DATABASE_URL selects the database; without it the backend falls back to
+#   the local SQLite file next to app.py.
+# - Server databases (Postgres, MySQL) get a connection pool sized from the
+#   environment, with pre-ping so connections dropped by the server or a proxy
+#   are replaced transparently, and recycling so none outlives server-side
+#   idle timeouts.
+# - SQLite gets a busy timeout and WAL journaling, so concurrent writers wait
+#   for the lock instead of failing with "database is locked" and readers are
+#   not blocked by an in-progress write.
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # seconds, -1 disables
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '15'))  # seconds
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+
+def database_uri(db_path):
+    return os.getenv('DATABASE_URL') or f'sqlite:///{db_path}'
+
+
+def describe(uri):
+    """The database URI for logs, with any password masked."""
+    return make_url(uri).render_as_string(hide_password=True)
+
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+
+def engine_options(uri):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS for the given database URI.
+
+    Args:
+        uri: The SQLAlchemy database URI
+
+    Returns:
+        Dictionary of keyword arguments for create_engine
+    """
+    if is_sqlite(uri):
+        # SQLite picks its own pool class (a single shared connection for
+        # in-memory databases), so only the lock wait is configured here
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT, 'check_same_thread': False}}
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__ != 'sqlite3':
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT * 1000)}')
+    cursor.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}')
+    cursor.execute(f'PRAGMA synchronous = {SQLITE_SYNCHRONOUS}')
+    cursor.close()
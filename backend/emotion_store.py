@@ -0,0 +1,282 @@
+# Columnar, NumPy-backed store of per-utterance emotion scores.
+#
+# Stored analyses (SessionAnalysis) are loaded once into flat arrays:
+#   scores           (utterances x labels) float32, patient utterances only
+#   session_offsets  where each session's rows start in `scores`
+#   session_mean     (sessions x labels) mean score per session
+#   session_patient / session_therapist / session_time / session_ids
+# and kept up to date incrementally by loading only rows newer than the last
+# one seen. Autoincrement ids are assigned before commit, so a row can become
+# visible after a larger id has been loaded; each refresh therefore re-scans
+# the last REFRESH_ID_WINDOW ids and skips the ones already loaded. Cohort questions ("which of my patients trended toward sadness
+# over the last 8 sessions") are then answered with vectorized operations over
+# the whole caseload instead of re-running the model or parsing JSON blobs.
+import json
+import os
+import threading
+
+import numpy as np
+
+from classification_model import distributions_from_bytes, labels as EMOTION_LABELS
+
+LOAD_BATCH_SIZE = 1000
+REFRESH_ID_WINDOW = int(os.getenv('EMOTION_STORE_REFRESH_WINDOW', '50'))
+
+
+def timeline_to_matrix(emotion_timeline, labels=EMOTION_LABELS):
+    """
+    Convert an emotionTimeline (list of {"label", "data"}) into a dense matrix.
+
+    Labels missing from the timeline (e.g. outside the top-2 kept by
+    detect_emotions) are scored 0.
+
+    Returns:
+        (patient utterances x labels) float32 array
+    """
+    label_index = {label: i for i, label in enumerate(labels)}
+    length = max((len(entry.get('data', [])) for entry in emotion_timeline), default=0)
+    matrix = np.zeros((length, len(labels)), dtype=np.float32)
+    for entry in emotion_timeline:
+        i = label_index.get(entry.get('label'))
+        data = entry.get('data', [])
+        if i is not None and data:
+            matrix[:len(data), i] = data
+    return matrix
+
+
+def last_valid(matrix):
+    """
+    Last non-NaN value of each row (NaN for rows with none).
+
+    Sessions without patient utterances have NaN means, so a patient's newest
+    session is not necessarily their latest score.
+    """
+    valid = ~np.isnan(matrix)
+    if matrix.shape[1] == 0:
+        return np.full(len(matrix), np.nan, dtype=matrix.dtype)
+    last = matrix.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    values = matrix[np.arange(len(matrix)), last]
+    return np.where(valid.any(axis=1), values, np.nan)
+
+
+class EmotionStore:
+    def __init__(self, labels=EMOTION_LABELS):
+        self.labels = list(labels)
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+        self.last_loaded_id = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        width = len(self.labels)
+
+        self.scores = np.empty((0, width), dtype=np.float32)
+        self.session_offsets = np.zeros(1, dtype=np.int64)
+        self.session_mean = np.empty((0, width), dtype=np.float32)
+        self.session_ids = np.empty(0, dtype=np.int64)
+        self.session_patient = np.empty(0, dtype=np.int64)
+        self.session_therapist = np.empty(0, dtype=np.int64)  # -1 when unknown
+        self.session_time = np.empty(0, dtype='datetime64[s]')
+
+    def __len__(self):
+        return len(self.session_ids)
+
+    # Loading
+
+    def append_sessions(self, session_ids, patient_ids, therapist_ids, times, utterance_scores):
+        """
+        Append a batch of sessions.
+
+        Args:
+            session_ids, patient_ids, therapist_ids, times: One value per session
+            utterance_scores: One (utterances x labels) array per session
+        """
+        if not len(session_ids):
+            return
+        width = len(self.labels)
+        counts = np.array([len(s) for s in utterance_scores], dtype=np.int64)
+        new_scores = (np.concatenate(utterance_scores).astype(np.float32, copy=False)
+                      if counts.sum() else np.empty((0, width), dtype=np.float32))
+
+        # Per-session means; reduceat can't handle empty segments, so skip them
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        means = np.full((len(counts), width), np.nan, dtype=np.float32)
+        nonempty = counts > 0
+        if nonempty.any():
+            sums = np.add.reduceat(new_scores, starts[nonempty], axis=0)
+            means[nonempty] = sums / counts[nonempty, None]
+
+        therapist_ids = np.array([-1 if t is None else t for t in therapist_ids], dtype=np.int64)
+        with self._lock:
+            self.session_offsets = np.concatenate((self.session_offsets, self.session_offsets[-1] + np.cumsum(counts)))
+            self.scores = np.concatenate((self.scores, new_scores))
+            self.session_mean = np.concatenate((self.session_mean, means))
+            self.session_ids = np.concatenate((self.session_ids, np.asarray(session_ids, dtype=np.int64)))
+            self.session_patient = np.concatenate((self.session_patient, np.asarray(patient_ids, dtype=np.int64)))
+            self.session_therapist = np.concatenate((self.session_therapist, therapist_ids))
+            self.session_time = np.concatenate((self.session_time, np.asarray(times, dtype='datetime64[s]')))
+            self.last_loaded_id = max(self.last_loaded_id, int(np.max(session_ids)))
+
+    def load_rows(self, rows, batch_size=LOAD_BATCH_SIZE, skip_ids=frozenset()):
+        """
+        Append rows of (id, patient_id, therapist_id, created_at, emotion_timeline JSON,
+        emotion_scores), ordered by id, except those in skip_ids. Returns the
+        number of sessions loaded.
+
+        Full distributions (emotion_scores) are used when stored; older rows
+        fall back to the top-2 emotionTimeline.
+        """
+        loaded = 0
+        batch = ([], [], [], [], [])
+        for row in rows:
+            if row.id in skip_ids:
+                continue
+            batch[0].append(row.id)
+            batch[1].append(row.patient_id)
+            batch[2].append(row.therapist_id)
+            batch[3].append(row.created_at)
+            if getattr(row, 'emotion_scores', None):
+                batch[4].append(distributions_from_bytes(row.emotion_scores))
+            else:
+                batch[4].append(timeline_to_matrix(json.loads(row.emotion_timeline or '[]'), self.labels))
+            if len(batch[0]) >= batch_size:
+                self.append_sessions(*batch)
+                loaded += len(batch[0])
+                batch = ([], [], [], [], [])
+        if batch[0]:
+            self.append_sessions(*batch)
+            loaded += len(batch[0])
+        return loaded
+
+    def refresh(self, fetch_rows, window=REFRESH_ID_WINDOW):
+        """
+        Load sessions not seen yet: everything newer than the last loaded id,
+        plus late-committed rows among the `window` ids before it.
+
+        Args:
+            fetch_rows: Callable taking an id and returning rows newer than it,
+                in the shape load_rows expects
+        """
+        # Serialize refreshes so concurrent requests don't load the same rows twice
+        with self._refresh_lock:
+            since = max(0, self.last_loaded_id - window)
+            with self._lock:
+                seen = set(self.session_ids[self.session_ids > since].tolist())
+            return self.load_rows(fetch_rows(since), skip_ids=seen)
+
+    # Queries
+
+    def _snapshot(self):
+        with self._lock:
+            return self.session_mean, self.session_patient, self.session_therapist, self.session_time
+
+    def _emotion_column(self, emotion):
+        if emotion not in self.label_index:
+            raise ValueError(f"Unknown emotion '{emotion}'. Expected one of: {', '.join(self.labels)}")
+        return self.label_index[emotion]
+
+    def last_sessions(self, emotion, n=8, therapist_id=None, patient_ids=None):
+        """
+        Per-patient mean score for emotion over each patient's last n sessions.
+
+        Returns:
+            (patient ids, patients x n float32 matrix) - oldest session on the
+            left, newest in the last column, NaN where a patient has fewer
+            than n sessions
+        """
+        column = self._emotion_column(emotion)
+        session_mean, session_patient, session_therapist, session_time = self._snapshot()
+        mask = np.ones(len(session_patient), dtype=bool)
+        if therapist_id is not None:
+            mask &= session_therapist == therapist_id
+        if patient_ids is not None:
+            mask &= np.isin(session_patient, patient_ids)
+        idx = np.flatnonzero(mask)
+        if idx.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, n), dtype=np.float32)
+
+        # Group sessions by patient, oldest first within each patient
+        idx = idx[np.lexsort((session_time[idx], session_patient[idx]))]
+        patients = session_patient[idx]
+        unique_patients, first, counts = np.unique(patients, return_index=True, return_counts=True)
+        group = np.repeat(np.arange(len(unique_patients)), counts)
+        from_end = counts[group] - 1 - (np.arange(len(idx)) - first[group])
+        keep = from_end < n
+
+        matrix = np.full((len(unique_patients), n), np.nan, dtype=np.float32)
+        matrix[group[keep], n - 1 - from_end[keep]] = session_mean[idx[keep], column]
+        return unique_patients, matrix
+
+    def trend(self, emotion, n=8, min_sessions=3, therapist_id=None, patient_ids=None):
+        """
+        Least-squares slope of each patient's per-session emotion score over
+        their last n sessions. Positive slope = trending toward the emotion.
+
+        Returns:
+            Dictionary of equal-length arrays: patient_id, slope, sessions,
+            latest (score of the newest session with patient utterances), mean
+        """
+        patients, matrix = self.last_sessions(emotion, n, therapist_id, patient_ids)
+        valid = ~np.isnan(matrix)
+        counts = valid.sum(axis=1)
+        weights = valid.astype(np.float64)
+        y = np.where(valid, matrix, 0.0).astype(np.float64)
+        x = np.arange(n, dtype=np.float64)[None, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_mean = (x * weights).sum(axis=1) / counts
+            y_mean = y.sum(axis=1) / counts
+            dx = (x - x_mean[:, None]) * weights
+            slope = (dx * (y - y_mean[:, None])).sum(axis=1) / (dx * dx).sum(axis=1)
+
+        keep = counts >= max(min_sessions, 2)
+        return {
+            'patient_id': patients[keep],
+            'slope': slope[keep],
+            'sessions': counts[keep],
+            'latest': last_valid(matrix)[keep],
+            'mean': y_mean[keep],
+        }
+
+    def moving_average(self, emotion, window=3, n=8, therapist_id=None, patient_ids=None):
+        """
+        NaN-aware moving average of each patient's per-session emotion score.
+
+        Returns:
+            (patient ids, patients x (n - window + 1) matrix)
+        """
+        window = max(1, min(window, n))
+        patients, matrix = self.last_sessions(emotion, n, therapist_id, patient_ids)
+        valid = ~np.isnan(matrix)
+        values = np.cumsum(np.pad(np.where(valid, matrix, 0.0), ((0, 0), (1, 0))), axis=1)
+        counts = np.cumsum(np.pad(valid.astype(np.float32), ((0, 0), (1, 0))), axis=1)
+        window_counts = counts[:, window:] - counts[:, :-window]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averages = (values[:, window:] - values[:, :-window]) / window_counts
+        averages[window_counts == 0] = np.nan
+        return patients, averages.astype(np.float32)
+
+    def anomalies(self, emotion, n=8, z_threshold=2.0, min_history=3, therapist_id=None, patient_ids=None):
+        """
+        Flag patients whose latest session deviates from their own previous
+        sessions by at least z_threshold standard deviations.
+
+        Returns:
+            Dictionary of equal-length arrays: patient_id, latest, baseline, z_score
+        """
+        patients, matrix = self.last_sessions(emotion, n, therapist_id, patient_ids)
+        history = matrix[:, :-1]
+        latest = matrix[:, -1]
+        valid = ~np.isnan(history)
+        counts = valid.sum(axis=1)
+        values = np.where(valid, history, 0.0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            baseline = values.sum(axis=1) / counts
+            variance = (np.where(valid, history - baseline[:, None], 0.0) ** 2).sum(axis=1) / counts
+            # Floor the spread so a perfectly flat history doesn't give infinite z-scores
+            z_scores = (latest - baseline) / np.maximum(np.sqrt(variance), 0.05)
+
+        flagged = (counts >= min_history) & ~np.isnan(latest) & (np.abs(z_scores) >= z_threshold)
+        return {
+            'patient_id': patients[flagged],
+            'latest': latest[flagged],
+            'baseline': baseline[flagged],
+            'z_score': z_scores[flagged],
+        }
@@ -0,0 +1,62 @@
+# Thin client for the local inference sidecar (inference_server.py).
+#
+# When INFERENCE_SERVER_URL is set, emotion detection is delegated to the
+# sidecar so that backend workers don't each hold a copy of the model. If the
+# sidecar can't be reached the call falls back to the in-process model, and the
+# sidecar is skipped for INFERENCE_RETRY_SECONDS before being tried again.
+import logging
+import os
+import threading
+import time
+
+import requests
+
+import classification_model
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_SERVER_URL = os.getenv("INFERENCE_SERVER_URL")  # e.g. http://127.0.0.1:5002
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "30"))
+INFERENCE_RETRY_SECONDS = float(os.getenv("INFERENCE_RETRY_SECONDS", "30"))
+
+_session = requests.Session()
+_state_lock = threading.Lock()
+_server_down_until = 0.0
+
+
+def _server_available():
+    return INFERENCE_SERVER_URL and time.monotonic() >= _server_down_until
+
+
+def _mark_server_down():
+    global _server_down_until
+    with _state_lock:
+        _server_down_until = time.monotonic() + INFERENCE_RETRY_SECONDS
+
+
+def detect_emotion_distributions(texts):
+    """Full emotion distribution per text, as a (texts x labels) float32 array."""
+    texts = list(texts)
+    if not texts:
+        return classification_model.detect_emotion_distributions(texts)
+    if _server_available():
+        try:
+            response = _session.post(
+                f"{INFERENCE_SERVER_URL.rstrip('/')}/detect-emotion-distributions",
+                json={"texts": texts},
+                timeout=INFERENCE_TIMEOUT,
+            )
+            response.raise_for_status()
+            return classification_model.decode_distributions(response.json()["distributions"])
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            logger.warning(f"Inference server unavailable, using in-process model: {str(e)}")
+            _mark_server_down()
+    return classification_model.detect_emotion_distributions(texts)
+
+
+def detect_emotions_batch(texts):
+    return [classification_model.top_emotions(row) for row in detect_emotion_distributions(texts)]
+
+
+def detect_emotions(text):
+    return detect_emotions_batch([text])[0]
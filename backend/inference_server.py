@@ -0,0 +1,241 @@
+# Local inference sidecar for the emotion classifier.
+#
+# Runs as its own process and owns the single copy of the BERT model. Backend
+# workers send emotion detection requests over localhost HTTP (see
+# inference_client.py); requests arriving from different workers are merged
+# into micro-batches so one forward pass serves many callers.
+#
+# Usage:
+#   python backend/inference_server.py
+#
+# Environment:
+#   INFERENCE_SERVER_HOST      bind address (default 127.0.0.1)
+#   INFERENCE_SERVER_PORT      bind port (default 5002)
+#   INFERENCE_MAX_BATCH_SIZE   max utterances per forward pass (default 32)
+#   INFERENCE_MAX_WAIT_MS      how long to wait for more work before running
+#                              a partial batch (default 10)
+#   INFERENCE_REQUEST_TIMEOUT  seconds a request may wait for its batch before
+#                              the server answers 503 (default 25, below the
+#                              client's INFERENCE_TIMEOUT so it can fall back)
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from classification_model import (INFERENCE_MAX_BATCH_SIZE, detect_emotion_distributions, encode_distributions,
+                                  load_model, top_emotions)
+from observability import setup_logging
+
+logger = setup_logging("inference")
+
+INFERENCE_SERVER_HOST = os.getenv("INFERENCE_SERVER_HOST", "127.0.0.1")
+INFERENCE_SERVER_PORT = int(os.getenv("INFERENCE_SERVER_PORT", "5002"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+INFERENCE_REQUEST_TIMEOUT = float(os.getenv("INFERENCE_REQUEST_TIMEOUT", "25"))
+
+# Upper bounds for the batch-size histogram exposed on /metrics
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+class _PendingRequest:
+    def __init__(self, texts):
+        self.texts = texts
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects emotion detection requests from concurrent callers and runs them
+    through the model together. Each caller gets back one distribution row
+    per text it submitted.
+
+    A batch is flushed when it reaches max_batch_size utterances or when the
+    oldest request has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+
+        self._metrics_lock = threading.Lock()
+        self.requests_total = 0
+        self.utterances_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.inference_seconds_total = 0.0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts, timeout=None):
+        pending = _PendingRequest(list(texts))
+        if not pending.texts:
+            return []
+        self.queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for inference")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        first = self.queue.get()
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for item in batch for text in item.texts]
+            started = time.perf_counter()
+            try:
+                # A single large transcript can exceed max_batch_size on its own
+                results = []
+                for start in range(0, len(texts), self.max_batch_size):
+                    results.extend(self.batch_fn(texts[start:start + self.max_batch_size]))
+                offset = 0
+                for item in batch:
+                    item.result = results[offset:offset + len(item.texts)]
+                    offset += len(item.texts)
+            except Exception as e:
+                logger.warning(f"Inference batch failed: {str(e)}")
+                for item in batch:
+                    item.error = e
+                with self._metrics_lock:
+                    self.errors_total += 1
+            finally:
+                elapsed = time.perf_counter() - started
+                self._record_batch(len(batch), len(texts), elapsed)
+                for item in batch:
+                    item.done.set()
+
+    def _record_batch(self, request_count, size, elapsed):
+        bucket = len(BATCH_SIZE_BUCKETS)
+        for i, upper in enumerate(BATCH_SIZE_BUCKETS):
+            if size <= upper:
+                bucket = i
+                break
+        with self._metrics_lock:
+            self.requests_total += request_count
+            self.utterances_total += size
+            self.batches_total += 1
+            self.inference_seconds_total += elapsed
+            self.batch_size_counts[bucket] += 1
+
+    def render_metrics(self):
+        with self._metrics_lock:
+            lines = [
+                "# TYPE inference_queue_depth gauge",
+                f"inference_queue_depth {self.queue.qsize()}",
+                "# TYPE inference_requests_total counter",
+                f"inference_requests_total {self.requests_total}",
+                "# TYPE inference_utterances_total counter",
+                f"inference_utterances_total {self.utterances_total}",
+                "# TYPE inference_batches_total counter",
+                f"inference_batches_total {self.batches_total}",
+                "# TYPE inference_errors_total counter",
+                f"inference_errors_total {self.errors_total}",
+                "# TYPE inference_seconds_total counter",
+                f"inference_seconds_total {self.inference_seconds_total:.6f}",
+                "# TYPE inference_batch_size histogram",
+            ]
+            cumulative = 0
+            for upper, count in zip(BATCH_SIZE_BUCKETS, self.batch_size_counts):
+                cumulative += count
+                lines.append(f'inference_batch_size_bucket{{le="{upper}"}} {cumulative}')
+            cumulative += self.batch_size_counts[-1]
+            lines.append(f'inference_batch_size_bucket{{le="+Inf"}} {cumulative}')
+            lines.append(f"inference_batch_size_sum {self.utterances_total}")
+            lines.append(f"inference_batch_size_count {self.batches_total}")
+        return "\n".join(lines) + "\n"
+
+
+batcher = None
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send(200, json.dumps({"status": "ok"}))
+        elif self.path == "/metrics":
+            self._send(200, batcher.render_metrics(), "text/plain; version=0.0.4")
+        else:
+            self._send(404, json.dumps({"error": "Not found"}))
+
+    def do_POST(self):
+        if self.path not in ("/detect-emotions", "/detect-emotion-distributions"):
+            self._send(404, json.dumps({"error": "Not found"}))
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+            texts = data.get("texts")
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                self._send(400, json.dumps({"error": "texts must be a list of strings"}))
+                return
+            try:
+                rows = batcher.submit(texts, timeout=INFERENCE_REQUEST_TIMEOUT)
+            except TimeoutError:
+                logger.warning(f"Inference request timed out after {INFERENCE_REQUEST_TIMEOUT}s "
+                               f"({batcher.queue.qsize()} queued)")
+                self._send(503, json.dumps({"error": "Inference timed out"}))
+                return
+            if self.path == "/detect-emotion-distributions":
+                # float32 so results match the in-process model exactly
+                self._send(200, json.dumps({"distributions": encode_distributions(rows, dtype="float32")}))
+            else:
+                self._send(200, json.dumps({"emotions": [top_emotions(row) for row in rows]}))
+        except Exception as e:
+            self._send(500, json.dumps({"error": str(e)}))
+
+    def log_message(self, format, *args):
+        # Per-request access logs would dominate the output under load
+        pass
+
+
+def main():
+    global batcher
+    logger.info("Loading emotion model...")
+    load_model()
+    batcher = MicroBatcher(detect_emotion_distributions)
+    server = ThreadingHTTPServer((INFERENCE_SERVER_HOST, INFERENCE_SERVER_PORT), InferenceRequestHandler)
+    server.daemon_threads = True
+    logger.info(f"Inference server listening on http://{INFERENCE_SERVER_HOST}:{INFERENCE_SERVER_PORT} "
+                f"(max batch {INFERENCE_MAX_BATCH_SIZE}, max wait {INFERENCE_MAX_WAIT_MS}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Password hashing with a configurable cost.
+#
+# PASSWORD_HASH_METHOD is passed to werkzeug's generate_password_hash, e.g.
+# "scrypt:16384:8:1" or "pbkdf2:sha256:260000"; unset means werkzeug's default.
+# Every hash records the method and parameters it was made with, so when the
+# setting changes, existing hashes still verify and are transparently
+# re-hashed with the new parameters on the user's next successful login.
+import os
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD') or None
+
+
+def _hash_kwargs(method):
+    return {'method': method} if method else {}
+
+
+def hash_password(password, method=None):
+    return generate_password_hash(password, **_hash_kwargs(method or PASSWORD_HASH_METHOD))
+
+
+def verify_password(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+def hash_parameters(password_hash):
+    """The method and parameters prefix of a werkzeug hash, e.g. "scrypt:32768:8:1"."""
+    return password_hash.split('$', 1)[0]
+
+
+# Werkzeug fills in defaults for a partial method ("pbkdf2" means
+# "pbkdf2:sha256:<default iterations>"), so derive the full prefix once
+CURRENT_HASH_PARAMETERS = hash_parameters(hash_password(''))
+
+
+def needs_rehash(password_hash):
+    return hash_parameters(password_hash) != CURRENT_HASH_PARAMETERS
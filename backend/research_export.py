@@ -0,0 +1,233 @@
+# Anonymized research export of sessions and stored transcript analyses.
+#
+# Rows are read in batches through server-side cursors (yield_per), turned
+# into anonymized records and written out incrementally, so memory use stays
+# bounded by the batch size no matter how large the tables are.
+#
+# Anonymization:
+#   - user, patient, therapist and row IDs are replaced with keyed HMAC-SHA256
+#     pseudonyms (EXPORT_HMAC_KEY); the same ID always maps to the same
+#     pseudonym for a given key, so records can still be joined
+#   - free text is dropped: session notes, utterances, generated summaries
+#   - timestamps are reduced to the date
+#
+# The export covers every patient of every therapist, so the HTTP endpoint is
+# an operator tool: it requires an "X-Export-Token" header matching
+# EXPORT_ADMIN_TOKEN and is disabled when that is unset. The CLI command
+# (flask export-research) needs no token.
+#
+# Output formats:
+#   - ndjson: one gzip-compressed NDJSON stream, each record has a "type"
+#   - parquet: sessions.parquet and analyses.parquet in an output directory
+#     (requires pyarrow), written one row group per batch
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import zlib
+
+EXPORT_HMAC_KEY = os.getenv('EXPORT_HMAC_KEY')
+EXPORT_ADMIN_TOKEN = os.getenv('EXPORT_ADMIN_TOKEN')
+EXPORT_TOKEN_HEADER = 'X-Export-Token'
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+
+class ExportError(Exception):
+    pass
+
+
+def get_export_key(key=None):
+    key = key or EXPORT_HMAC_KEY
+    if not key:
+        raise ExportError('EXPORT_HMAC_KEY must be set to pseudonymize IDs')
+    return key.encode('utf-8') if isinstance(key, str) else key
+
+
+def is_authorized(token):
+    """True if token matches EXPORT_ADMIN_TOKEN (never when it is unset)."""
+    return bool(EXPORT_ADMIN_TOKEN and token and hmac.compare_digest(token, EXPORT_ADMIN_TOKEN))
+
+
+def pseudonymize(value, key, kind):
+    if value is None:
+        return None
+    digest = hmac.new(key, f"{kind}:{value}".encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"{kind[0]}_{digest[:20]}"
+
+
+def _date(value):
+    return value.date().isoformat() if value else None
+
+
+def _load_json(value, default):
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        return default
+
+
+def session_record(row, key):
+    return {
+        'type': 'session',
+        'session_id': pseudonymize(row.id, key, 'session'),
+        'user_id': pseudonymize(row.user_id, key, 'user'),
+        'session_type': row.session_type,
+        'duration': row.duration,
+        'date': _date(row.created_at),
+    }
+
+
+def analysis_record(row, key):
+    transcript = _load_json(row.transcript, [])
+    return {
+        'type': 'analysis',
+        'analysis_id': pseudonymize(row.id, key, 'analysis'),
+        'patient_id': pseudonymize(row.patient_id, key, 'user'),
+        'therapist_id': pseudonymize(row.therapist_id, key, 'user'),
+        'source': row.source,
+        'date': _date(row.created_at),
+        'utterance_count': row.utterance_count,
+        # Per-utterance labels only - the utterance text itself is PII
+        'utterances': [
+            {
+                'speaker': entry.get('speaker'),
+                'emotions': entry.get('emotions', []),
+                'themes': entry.get('themes', []),
+                'distortions': entry.get('distortions', []),
+            }
+            for entry in transcript
+        ],
+        'emotion_timeline': _load_json(row.emotion_timeline, []),
+        'themes_summary': _load_json(row.themes_summary, {}),
+        'distortion_summary': _load_json(row.distortion_summary, {}),
+    }
+
+
+def iter_session_records(db, session_model, key, batch_size=EXPORT_BATCH_SIZE):
+    # Column queries avoid building ORM objects and the identity map entirely
+    query = (db.session.query(session_model.id, session_model.user_id, session_model.session_type,
+                              session_model.duration, session_model.created_at)
+             .order_by(session_model.id)
+             .yield_per(batch_size))
+    for row in query:
+        yield session_record(row, key)
+
+
+def iter_analysis_records(db, analysis_model, key, batch_size=EXPORT_BATCH_SIZE):
+    query = (db.session.query(analysis_model.id, analysis_model.patient_id, analysis_model.therapist_id,
+                              analysis_model.source, analysis_model.created_at, analysis_model.utterance_count,
+                              analysis_model.transcript, analysis_model.emotion_timeline,
+                              analysis_model.themes_summary, analysis_model.distortion_summary)
+             .order_by(analysis_model.id)
+             .yield_per(batch_size))
+    for row in query:
+        yield analysis_record(row, key)
+
+
+def iter_records(db, session_model, analysis_model, key, batch_size=EXPORT_BATCH_SIZE):
+    yield from iter_session_records(db, session_model, key, batch_size)
+    yield from iter_analysis_records(db, analysis_model, key, batch_size)
+
+
+def _ndjson_line(record):
+    return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def iter_ndjson_gzip(records, flush_every=EXPORT_BATCH_SIZE):
+    """Yield gzip-compressed NDJSON chunks for records, suitable for a streaming response."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for count, record in enumerate(records, 1):
+        chunk = compressor.compress(_ndjson_line(record))
+        if count % flush_every == 0:
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def write_ndjson_gzip(records, path):
+    count = 0
+    with gzip.open(path, 'wb') as f:
+        for record in records:
+            f.write(_ndjson_line(record))
+            count += 1
+    return count
+
+
+# Nested fields are stored as JSON strings in Parquet to keep the schemas flat
+_PARQUET_JSON_FIELDS = {'utterances', 'emotion_timeline', 'themes_summary', 'distortion_summary'}
+
+
+def _parquet_schema(pa, kind):
+    if kind == 'session':
+        return pa.schema([('session_id', pa.string()), ('user_id', pa.string()), ('session_type', pa.string()),
+                          ('duration', pa.int64()), ('date', pa.string())])
+    return pa.schema([('analysis_id', pa.string()), ('patient_id', pa.string()), ('therapist_id', pa.string()),
+                      ('source', pa.string()), ('date', pa.string()), ('utterance_count', pa.int64()),
+                      ('utterances', pa.string()), ('emotion_timeline', pa.string()),
+                      ('themes_summary', pa.string()), ('distortion_summary', pa.string())])
+
+
+def _write_parquet(records, path, kind, batch_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet export requires pyarrow (pip install pyarrow)')
+
+    schema = _parquet_schema(pa, kind)
+    writer = pq.ParquetWriter(path, schema, compression='zstd')
+
+    batch = []
+    count = 0
+
+    def flush():
+        columns = {}
+        for name in schema.names:
+            values = [r[name] for r in batch]
+            if name in _PARQUET_JSON_FIELDS:
+                values = [json.dumps(v, separators=(',', ':')) for v in values]
+            columns[name] = values
+        writer.write_table(pa.table(columns, schema=schema))
+
+    try:
+        for record in records:
+            batch.append(record)
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+    finally:
+        writer.close()
+    return count
+
+
+def export(db, session_model, analysis_model, output, fmt='ndjson', batch_size=EXPORT_BATCH_SIZE, key=None):
+    """
+    Export anonymized sessions and analyses.
+
+    Args:
+        output: File path for ndjson (gzip), directory for parquet
+        fmt: 'ndjson' or 'parquet'
+
+    Returns:
+        Dictionary of record counts by type
+    """
+    key = get_export_key(key)
+    if fmt == 'ndjson':
+        count = write_ndjson_gzip(iter_records(db, session_model, analysis_model, key, batch_size), output)
+        return {'records': count}
+    if fmt == 'parquet':
+        os.makedirs(output, exist_ok=True)
+        return {
+            'sessions': _write_parquet(iter_session_records(db, session_model, key, batch_size),
+                                       os.path.join(output, 'sessions.parquet'), 'session', batch_size),
+            'analyses': _write_parquet(iter_analysis_records(db, analysis_model, key, batch_size),
+                                       os.path.join(output, 'analyses.parquet'), 'analysis', batch_size),
+        }
+    raise ExportError(f"Unknown export format: {fmt}")
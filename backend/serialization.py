@@ -0,0 +1,133 @@
+# Response encoding for transcript analysis payloads.
+#
+# - Fast JSON: uses orjson when installed, otherwise the standard library
+#   encoder with compact separators.
+# - Columnar format (opt-in with ?format=compact or "X-Response-Format:
+#   compact"): per-utterance fields become parallel arrays, so keys such as
+#   "label"/"score"/"themes" are written once instead of once per utterance.
+# - MessagePack (opt-in with "Accept: application/msgpack"), when msgpack is
+#   installed.
+# - gzip compression when the client sends "Accept-Encoding: gzip" and the
+#   body is larger than COMPRESSION_MIN_BYTES.
+import gzip
+import json
+import os
+
+from flask import Response, request
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '5'))
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+VARY_HEADERS = ('Accept', 'Accept-Encoding', 'X-Response-Format')
+
+
+def _default(value):
+    # NumPy scalars and arrays (e.g. emotion scores) for the stdlib/msgpack encoders
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def dumps_msgpack(payload):
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+def to_columnar(analysis_result):
+    """
+    Convert an analysis result to the columnar format.
+
+    "transcript" becomes a dictionary of parallel arrays (index, speaker,
+    utterance, emotionLabels, emotionScores, themes, distortions) and
+    "emotionTimeline" becomes {"labels": [...], "data": [[...], ...]}.
+    All other fields are passed through unchanged.
+    """
+    result = dict(analysis_result)
+    transcript = analysis_result.get('transcript')
+    if isinstance(transcript, list):
+        result['transcript'] = {
+            'index': [entry.get('index', i) for i, entry in enumerate(transcript)],
+            'speaker': [entry.get('speaker') for entry in transcript],
+            'utterance': [entry.get('utterance') for entry in transcript],
+            'emotionLabels': [[e['label'] for e in entry.get('emotions', [])] for entry in transcript],
+            'emotionScores': [[e['score'] for e in entry.get('emotions', [])] for entry in transcript],
+            'themes': [entry.get('themes', []) for entry in transcript],
+            'distortions': [entry.get('distortions', []) for entry in transcript],
+        }
+    timeline = analysis_result.get('emotionTimeline')
+    if isinstance(timeline, list):
+        result['emotionTimeline'] = {
+            'labels': [entry['label'] for entry in timeline],
+            'data': [entry['data'] for entry in timeline],
+        }
+    result['format'] = 'columnar'
+    return result
+
+
+def wants_columnar():
+    return (request.args.get('format') == 'compact'
+            or request.headers.get('X-Response-Format', '').lower() == 'compact')
+
+
+def msgpack_acceptable(accept):
+    """True if an Accept header value prefers MessagePack to JSON (honouring q-values)."""
+    if msgpack is None:
+        return False
+    best = parse_accept_header(accept, MIMEAccept).best_match(('application/json',) + MSGPACK_MIMETYPES)
+    return best in MSGPACK_MIMETYPES
+
+
+def gzip_acceptable(accept_encoding):
+    """True if an Accept-Encoding header value allows gzip (q > 0)."""
+    return parse_accept_header(accept_encoding)['gzip'] > 0
+
+
+def wants_msgpack():
+    return msgpack_acceptable(request.headers.get('Accept'))
+
+
+def encode_analysis(payload, columnar=False, msgpack_accepted=False, gzip_accepted=False):
+    """
+    Encode an analysis payload independently of the web framework.
+
+    Returns:
+        (body bytes, mimetype, content encoding or None)
+    """
+    if columnar:
+        payload = to_columnar(payload)
+    if msgpack_accepted and msgpack is not None:
+        body, mimetype = dumps_msgpack(payload), 'application/msgpack'
+    else:
+        body, mimetype = dumps_json(payload), 'application/json'
+    if gzip_accepted and len(body) >= COMPRESSION_MIN_BYTES:
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVEL), mimetype, 'gzip'
+    return body, mimetype, None
+
+
+def analysis_response(payload, status=200):
+    """Encode an analysis payload according to the request's format, Accept and Accept-Encoding."""
+    body, mimetype, encoding = encode_analysis(payload, wants_columnar(), wants_msgpack(),
+                                               gzip_acceptable(request.headers.get('Accept-Encoding')))
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.update(VARY_HEADERS)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
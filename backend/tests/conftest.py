@@ -0,0 +1,14 @@
+# Backend modules import each other top-level (as when run from backend/), and
+# shared modules live at the repository root. The PDF service (frontend/api.py)
+# is importable as `api`; frontend/ goes last so `asgi` stays the backend's.
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ROOT = os.path.abspath(os.path.join(BACKEND_DIR, '..'))
+FRONTEND_DIR = os.path.join(ROOT, 'frontend')
+for path in (ROOT, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+if FRONTEND_DIR not in sys.path:
+    sys.path.append(FRONTEND_DIR)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from emotion_store import EmotionStore, last_valid
+
+LABELS = ['sadness', 'joy']
+
+
+def scores(*sadness):
+    """One session's (utterances x labels) matrix with the given sadness scores."""
+    return np.array([[value, 1.0 - value] for value in sadness], dtype=np.float32).reshape(-1, 2)
+
+
+def make_store(sessions):
+    """sessions: list of (patient_id, day, utterance sadness scores)"""
+    store = EmotionStore(labels=LABELS)
+    store.append_sessions(
+        list(range(1, len(sessions) + 1)),
+        [patient for patient, _, _ in sessions],
+        [7] * len(sessions),
+        [np.datetime64('2024-01-01') + np.timedelta64(day, 'D') for _, day, _ in sessions],
+        [scores(*values) for _, _, values in sessions],
+    )
+    return store
+
+
+def test_last_valid_skips_trailing_nan():
+    matrix = np.array([[0.1, 0.2, np.nan], [np.nan, np.nan, np.nan], [0.3, np.nan, 0.4]], dtype=np.float32)
+    result = last_valid(matrix)
+    assert result[0] == np.float32(0.2)
+    assert np.isnan(result[1])
+    assert result[2] == np.float32(0.4)
+
+
+def test_trend_latest_ignores_empty_last_session():
+    store = make_store([
+        (1, 0, [0.2]),
+        (1, 1, [0.4]),
+        (1, 2, [0.6, 0.6]),
+        (1, 3, []),  # newest session has no patient utterances
+    ])
+    trend = store.trend('sadness', n=4, min_sessions=3)
+    assert trend['patient_id'].tolist() == [1]
+    assert trend['sessions'].tolist() == [3]
+    assert np.isclose(trend['latest'][0], 0.6)
+    assert trend['slope'][0] > 0
+
+
+def test_moving_average_is_nan_where_window_is_empty():
+    store = make_store([(1, 0, [0.2]), (1, 1, []), (1, 2, [])])
+    _, averages = store.moving_average('sadness', window=2, n=3)
+    assert np.isclose(averages[0, 0], 0.2)
+    assert np.isnan(averages[0, -1])
+    assert np.isclose(last_valid(averages)[0], 0.2)
+
+
+def test_last_sessions_keeps_newest_n_per_patient():
+    store = make_store([(1, day, [day / 10]) for day in range(5)] + [(2, 0, [0.9])])
+    patients, matrix = store.last_sessions('sadness', n=3)
+    assert patients.tolist() == [1, 2]
+    assert np.allclose(matrix[0], [0.2, 0.3, 0.4])
+    assert np.isnan(matrix[1, :2]).all() and np.isclose(matrix[1, 2], 0.9)
+
+
+def test_anomalies_flag_a_sharp_change():
+    store = make_store([(1, day, [0.2]) for day in range(5)] + [(1, 5, [0.9])]
+                       + [(2, day, [0.3]) for day in range(6)])
+    result = store.anomalies('sadness', n=6, z_threshold=2.0)
+    assert result['patient_id'].tolist() == [1]
+    assert result['z_score'][0] > 2.0
+
+
+def test_unknown_emotion_is_rejected():
+    store = make_store([(1, 0, [0.5])])
+    with pytest.raises(ValueError, match='boredom'):
+        store.trend('boredom')
+
+
+class Row:
+    def __init__(self, id, patient_id=1, day=0):
+        self.id = id
+        self.patient_id = patient_id
+        self.therapist_id = 7
+        self.created_at = np.datetime64('2024-01-01') + np.timedelta64(day, 'D')
+        self.emotion_timeline = '[{"label": "sadness", "data": [0.5]}]'
+        self.emotion_scores = None
+
+
+def test_refresh_picks_up_rows_committed_out_of_order():
+    committed = [Row(1), Row(3, day=2)]  # id 2 was assigned first but is not committed yet
+    store = EmotionStore(labels=LABELS)
+
+    def fetch_rows(after_id):
+        return sorted((row for row in committed if row.id > after_id), key=lambda row: row.id)
+
+    assert store.refresh(fetch_rows) == 2
+    committed.append(Row(2, day=1))
+    assert store.refresh(fetch_rows) == 1
+    assert store.refresh(fetch_rows) == 0
+    assert sorted(store.session_ids.tolist()) == [1, 2, 3]
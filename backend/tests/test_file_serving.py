@@ -0,0 +1,39 @@
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import file_serving
+from file_serving import InvalidUpload, save_profile_picture
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png_upload(width, height):
+    data = io.BytesIO()
+    Image.new('RGB', (width, height)).save(data, format='PNG')
+    data.seek(0)
+    return FileStorage(stream=data, filename='picture.png')
+
+
+def test_profile_picture_writes_thumbnails(tmp_path):
+    path = save_profile_picture(png_upload(300, 200), str(tmp_path), 'u1.png')
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == sorted(['u1.png'] + [file_serving.thumbnail_name('u1.png', size)
+                                         for size in file_serving.PROFILE_THUMBNAIL_SIZES])
+    assert path == str(tmp_path / 'u1.png')
+
+
+def test_not_an_image_is_rejected_and_removed(tmp_path):
+    upload = FileStorage(stream=io.BytesIO(b'not a png'), filename='picture.png')
+    with pytest.raises(InvalidUpload):
+        save_profile_picture(upload, str(tmp_path), 'u1.png')
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_decompression_bomb_is_rejected_and_removed(tmp_path, monkeypatch):
+    # Pillow raises DecompressionBombError past twice MAX_IMAGE_PIXELS
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with pytest.raises(InvalidUpload):
+        save_profile_picture(png_upload(100, 100), str(tmp_path), 'u1.png')
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,59 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import classification_model
+from inference_server import MicroBatcher
+
+
+class StubTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def numpy(self):
+        return self.array
+
+
+def stub_model(batch_sizes):
+    """A tokenizer and model pair that records how many texts each forward pass got."""
+    def tokenizer(texts, **kwargs):
+        batch_sizes.append(len(texts))
+        return {'ids': np.array([[len(text)] for text in texts], dtype=np.float32)}
+
+    def model(ids):
+        return SimpleNamespace(logits=np.repeat(ids, len(classification_model.labels), axis=1))
+
+    return tokenizer, model
+
+
+def test_distributions_run_in_chunks_of_batch_size(monkeypatch):
+    batch_sizes = []
+    monkeypatch.setattr(classification_model, 'load_model', lambda: stub_model(batch_sizes))
+    monkeypatch.setattr(classification_model.F, 'softmax', lambda logits, dim: StubTensor(logits))
+    texts = ['x' * (i + 1) for i in range(7)]
+    rows = classification_model.detect_emotion_distributions(texts, batch_size=3)
+    assert batch_sizes == [3, 3, 1]
+    assert rows.dtype == np.float32
+    # Rows stay in input order across chunks
+    assert rows[:, 0].tolist() == [float(i + 1) for i in range(7)]
+
+
+def test_batcher_returns_rows_per_caller():
+    batcher = MicroBatcher(lambda texts: [[len(text)] for text in texts], max_batch_size=2, max_wait_ms=1)
+    assert batcher.submit(['a', 'bb', 'ccc']) == [[1], [2], [3]]
+    assert batcher.submit([]) == []
+
+
+def test_batcher_submit_times_out():
+    release = threading.Event()
+
+    def slow(texts):
+        release.wait(5)
+        return [[0] for _ in texts]
+
+    batcher = MicroBatcher(slow, max_wait_ms=1)
+    with pytest.raises(TimeoutError):
+        batcher.submit(['a'], timeout=0.05)
+    release.set()
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+
+import llm_client
+
+
+def use_transport(monkeypatch, handler):
+    requests = []
+
+    def record(request):
+        requests.append(request)
+        return handler(request)
+
+    client = httpx.Client(base_url='http://gemini.test', transport=httpx.MockTransport(record))
+    monkeypatch.setattr(llm_client, '_sync_client', client)
+    return requests
+
+
+def test_generate_sync_returns_text(monkeypatch):
+    requests = use_transport(monkeypatch, lambda request: httpx.Response(
+        200, json={'candidates': [{'content': {'parts': [{'text': 'A summary.'}]}}]}))
+    text = llm_client.generate_sync('Summarize', model='summary-model', generation_config={'temperature': 0.2})
+    assert text == 'A summary.'
+    assert requests[0].url.path == '/v1beta/models/summary-model:generateContent'
+    assert b'"temperature":0.2' in requests[0].content.replace(b' ', b'')
+
+
+@pytest.mark.parametrize('response', [
+    httpx.Response(503, json={'error': {'message': 'overloaded'}}),
+    httpx.Response(200, json={'error': {'message': 'blocked'}}),
+])
+def test_generate_sync_raises_instead_of_returning_fallback_text(monkeypatch, response):
+    use_transport(monkeypatch, lambda request: response)
+    with pytest.raises(llm_client.LLMError):
+        llm_client.generate_sync('Summarize')
+
+
+def test_generate_sync_raises_when_unreachable(monkeypatch):
+    def refuse(request):
+        raise httpx.ConnectError('refused', request=request)
+
+    use_transport(monkeypatch, refuse)
+    with pytest.raises(llm_client.LLMError):
+        llm_client.generate_sync('Summarize')
+
+
+def test_system_instruction_is_sent_separately(monkeypatch):
+    requests = use_transport(monkeypatch, lambda request: httpx.Response(
+        200, json={'candidates': [{'content': {'parts': [{'text': 'Hello.'}]}}]}))
+    llm_client.generate_sync('Hi', system_instruction='Be kind.')
+    payload = json.loads(requests[0].content)
+    assert payload['systemInstruction'] == {'parts': [{'text': 'Be kind.'}]}
+    assert payload['contents'] == [{'role': 'user', 'parts': [{'text': 'Hi'}]}]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip('faiss')
+pytest.importorskip('fitz')
+pytest.importorskip('google.generativeai')
+pytest.importorskip('flask_cors')
+
+import api
+
+
+def make_doc(chunks, vectors):
+    index = faiss.IndexFlatL2(2)
+    index.add(np.asarray(vectors, dtype=np.float32))
+    return {'chunks': chunks, 'index': index, 'filepath': None, 'tags': []}
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    docs = {}
+    monkeypatch.setattr(api, 'documents', docs)
+    monkeypatch.setattr(api.model_registry, 'embed', lambda texts: np.zeros((1, 2), dtype=np.float32))
+    return docs
+
+
+def test_merge_results_drops_duplicates_across_documents(documents):
+    shared = 'the patient takes sertraline fifty milligrams every morning with breakfast'
+    documents['notes.pdf'] = make_doc([shared, 'sleep has improved over the last two weeks'],
+                                      [[0.1, 0], [0.3, 0]])
+    documents['discharge.pdf'] = make_doc([shared + ' as before', 'follow up with the clinic in a month'],
+                                          [[0.2, 0], [0.4, 0]])
+    docs = api.snapshot_documents(['notes.pdf', 'discharge.pdf'])
+    results = [api.search_document(name, doc, np.zeros((1, 2), dtype=np.float32), 3) for name, doc in docs.items()]
+    hits = api.merge_results(results, docs, 3)
+    assert [(name, position) for _, name, position in hits] == [
+        ('notes.pdf', 0), ('notes.pdf', 1), ('discharge.pdf', 1)]
+
+
+def test_merge_results_keeps_k_nearest(documents):
+    documents['a.pdf'] = make_doc(['alpha one', 'alpha two', 'alpha three'], [[0.1, 0], [0.5, 0], [0.9, 0]])
+    documents['b.pdf'] = make_doc(['beta one', 'beta two'], [[0.2, 0], [0.6, 0]])
+    hits = api.retrieve_from_documents(api.snapshot_documents(['a.pdf', 'b.pdf']), 'question', 3)
+    assert [(name, position) for _, name, position in hits] == [('a.pdf', 0), ('b.pdf', 0), ('a.pdf', 1)]
+    context = api.build_context(hits, api.snapshot_documents(['a.pdf', 'b.pdf']))
+    assert context.startswith('[a.pdf]\nalpha one')
+
+
+def test_reupload_during_question_uses_one_version(documents, monkeypatch):
+    documents['a.pdf'] = make_doc(['old first', 'old second'], [[1, 0], [0.1, 0]])
+    documents['b.pdf'] = make_doc(['other document'], [[5, 0]])
+    docs = api.snapshot_documents(['a.pdf', 'b.pdf'])
+
+    def embed_while_reuploading(texts):
+        # The new version has its chunks in a different order and is longer
+        documents['a.pdf'] = make_doc(['new zero', 'new first', 'new second'], [[9, 0], [9, 0], [0.1, 0]])
+        return np.zeros((1, 2), dtype=np.float32)
+
+    monkeypatch.setattr(api.model_registry, 'embed', embed_while_reuploading)
+    hits = api.retrieve_from_documents(docs, 'question', 2)
+    assert [(name, position) for _, name, position in hits] == [('a.pdf', 1), ('a.pdf', 0)]
+    assert api.build_context(hits, docs) == 'old second\nold first'
+
+
+def test_snapshot_of_missing_document_raises(documents):
+    with pytest.raises(LookupError):
+        api.snapshot_documents(['missing.pdf'])
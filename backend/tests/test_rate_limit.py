@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+import rate_limit
+from rate_limit import AdmissionController, MemoryBucketStore, SQLiteBucketStore
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    store = MemoryBucketStore()
+    assert [store.take('a', 1.0, 3)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = store.take('a', 1.0, 3)
+    assert not allowed
+    assert 0 < retry_after <= 1.0
+    # Other clients have their own buckets
+    assert store.take('b', 1.0, 3)[0]
+
+
+def test_memory_store_evicts_least_recently_used_past_cap():
+    store = MemoryBucketStore(max_keys=3)
+    for key in ('a', 'b', 'c'):
+        store.take(key, 0.0, 1)
+    store.take('a', 0.0, 1)  # 'a' is now the most recently used, 'b' the least
+    store.take('d', 0.0, 1)
+    assert len(store) == 3
+    # 'b' was dropped and starts over with a full bucket; 'a' is still empty
+    assert store.take('b', 0.0, 1)[0]
+    assert not store.take('a', 0.0, 1)[0]
+
+
+def test_memory_store_stays_bounded_with_buckets_that_never_refill():
+    store = MemoryBucketStore(max_keys=100)
+    for i in range(1000):
+        store.take(f"client-{i}", 0.0, 1)
+    assert len(store) == 100
+
+
+def test_sqlite_store_deletes_full_buckets(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / 'buckets.db'), cleanup_interval=3600)
+    store.take('refilling', 1.0, 2)
+    store.take('empty', 0.0, 1)
+    assert not store.take('empty', 0.0, 1)[0]
+    deleted = store.cleanup(now=10 ** 12)
+    assert deleted == 1
+    # The bucket that never refills is kept, so its client stays limited
+    assert not store.take('empty', 0.0, 1)[0]
+
+
+def test_rejection_clamps_infinite_retry_after():
+    _, status, headers = rate_limit.too_many_requests(float('inf'))
+    assert status == 429
+    assert headers['Retry-After'] == str(rate_limit.MAX_RETRY_AFTER)
+    assert rate_limit.too_many_requests(0.2)[2]['Retry-After'] == '1'
+
+
+def test_admission_controller_rejects_when_queue_is_full():
+    controller = AdmissionController(1, queue_size=0, queue_timeout=0.01)
+    assert controller.acquire()
+    assert not controller.acquire()
+    assert not controller.try_acquire()
+    controller.release(0.5)
+    assert controller.try_acquire()
+
+
+def test_admission_controller_queued_request_times_out():
+    controller = AdmissionController(1, queue_size=1, queue_timeout=0.05)
+    assert controller.acquire()
+    assert not controller.acquire()
+    assert controller.waiting == 0
+
+
+def test_admission_controller_admits_queued_request_on_release():
+    controller = AdmissionController(1, queue_size=1, queue_timeout=5)
+    assert controller.acquire()
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(controller.acquire()))
+    waiter.start()
+    while controller.waiting == 0:
+        pass
+    controller.release()
+    waiter.join(timeout=5)
+    assert results == [True]
+    assert controller.in_flight == 1
+
+
+def test_retry_after_grows_with_queue():
+    controller = AdmissionController(2, queue_size=4)
+    controller.avg_service_time = 2.0
+    assert controller.retry_after() == pytest.approx(1.0)
+    controller.waiting = 3
+    assert controller.retry_after() == pytest.approx(4.0)
@@ -0,0 +1,50 @@
+import gzip
+import json
+
+import pytest
+
+import serialization
+from serialization import encode_analysis, gzip_acceptable, msgpack_acceptable
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip', True),
+    ('deflate, gzip;q=0.5', True),
+    ('*', True),
+    ('gzip;q=0', False),
+    ('gzip;q=0.0, deflate', False),
+    ('identity', False),
+    (None, False),
+])
+def test_gzip_acceptable_honours_q_values(accept_encoding, expected):
+    assert gzip_acceptable(accept_encoding) is expected
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('application/msgpack', True),
+    ('application/x-msgpack', True),
+    ('application/json;q=0.5, application/msgpack', True),
+    ('application/json, application/msgpack;q=0.5', False),
+    ('application/msgpack;q=0, application/json', False),
+    ('application/json', False),
+    ('*/*', False),
+    (None, False),
+])
+def test_msgpack_acceptable_honours_q_values(accept, expected):
+    pytest.importorskip('msgpack')
+    assert msgpack_acceptable(accept) is expected
+
+
+def test_msgpack_never_acceptable_without_msgpack(monkeypatch):
+    monkeypatch.setattr(serialization, 'msgpack', None)
+    assert not msgpack_acceptable('application/msgpack')
+
+
+def test_encode_analysis_gzips_large_bodies_only(monkeypatch):
+    monkeypatch.setattr(serialization, 'COMPRESSION_MIN_BYTES', 100)
+    small = {'summary': 'short'}
+    large = {'summary': 'x' * 500}
+    assert encode_analysis(small, gzip_accepted=True)[2] is None
+    body, mimetype, encoding = encode_analysis(large, gzip_accepted=True)
+    assert (mimetype, encoding) == ('application/json', 'gzip')
+    assert json.loads(gzip.decompress(body)) == large
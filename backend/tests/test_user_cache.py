@@ -0,0 +1,94 @@
+import pytest
+
+import user_cache
+from user_cache import UserCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(user_cache.time, 'monotonic', clock)
+    return clock
+
+
+class Users:
+    """Loader standing in for the database; counts lookups."""
+
+    def __init__(self, *records):
+        self.records = {r['id']: dict(r) for r in records}
+        self.loads = 0
+
+    def by_id(self, user_id):
+        self.loads += 1
+        record = self.records.get(user_id)
+        return dict(record) if record else None
+
+    def by_email(self, email):
+        self.loads += 1
+        return next((dict(r) for r in self.records.values() if r['email'] == email), None)
+
+
+def user(user_id, email):
+    return {'id': user_id, 'email': email, 'username': f"user{user_id}", 'role': 'patient'}
+
+
+def test_hits_within_ttl_and_reloads_after(clock):
+    users = Users(user(1, 'a@example.com'))
+    cache = UserCache(ttl=30)
+    assert cache.get_by_id('1', users.by_id)['email'] == 'a@example.com'
+    assert cache.get_by_email('a@example.com', users.by_email)['id'] == 1
+    assert users.loads == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    clock.now += 31
+    cache.get_by_id(1, users.by_id)
+    assert users.loads == 2
+
+
+def test_invalidate_drops_id_and_email(clock):
+    users = Users(user(1, 'a@example.com'))
+    cache = UserCache(ttl=30)
+    cache.get_by_id(1, users.by_id)
+    users.records[1]['email'] = 'b@example.com'
+    cache.invalidate('1')
+    assert cache.get_by_email('a@example.com', users.by_email) is None
+    assert cache.get_by_id(1, users.by_id)['email'] == 'b@example.com'
+    assert cache.get_by_email('b@example.com', users.by_email)['id'] == 1
+    assert users.loads == 3
+
+
+def test_misses_are_not_cached(clock):
+    users = Users()
+    cache = UserCache(ttl=30)
+    assert cache.get_by_id(2, users.by_id) is None
+    users.records[2] = user(2, 'new@example.com')
+    assert cache.get_by_id(2, users.by_id)['email'] == 'new@example.com'
+
+
+def test_eviction_removes_least_recently_used(clock):
+    users = Users(user(1, 'a@example.com'), user(2, 'b@example.com'), user(3, 'c@example.com'))
+    cache = UserCache(ttl=30, max_size=2)
+    cache.get_by_id(1, users.by_id)
+    cache.get_by_id(2, users.by_id)
+    cache.get_by_id(1, users.by_id)
+    cache.get_by_id(3, users.by_id)
+    loads = users.loads
+    cache.get_by_id(1, users.by_id)
+    assert users.loads == loads
+    cache.get_by_email('b@example.com', users.by_email)
+    assert users.loads == loads + 1
+
+
+def test_zero_ttl_disables_caching(clock):
+    users = Users(user(1, 'a@example.com'))
+    cache = UserCache(ttl=0)
+    cache.get_by_id(1, users.by_id)
+    cache.get_by_id(1, users.by_id)
+    assert users.loads == 2
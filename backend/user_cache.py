@@ -0,0 +1,91 @@
+# Short-lived in-process cache of user records, keyed by ID and by email.
+#
+# Login, /api/user and the role checks on therapist endpoints look users up on
+# every request. The cache keeps a plain-dict snapshot of each user (never an
+# ORM instance, which is bound to the request's database session) for
+# USER_CACHE_TTL seconds. Entries are invalidated when the user is updated
+# through this process; with several workers, a change made on another worker
+# is visible after at most USER_CACHE_TTL seconds. Misses are not cached, so a
+# newly registered user is found immediately.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '30'))  # seconds, 0 disables
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', '10000'))
+
+
+class UserCache:
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._by_id = OrderedDict()  # id -> (expires_at, record)
+        self._email_to_id = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, user_id):
+        with self._lock:
+            entry = self._by_id.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._by_id.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, record):
+        if self.ttl <= 0:
+            return record
+        with self._lock:
+            previous = self._by_id.pop(record['id'], None)
+            if previous is not None:
+                self._email_to_id.pop(previous[1]['email'], None)
+            self._by_id[record['id']] = (time.monotonic() + self.ttl, record)
+            self._email_to_id[record['email']] = record['id']
+            while len(self._by_id) > self.max_size:
+                _, (_, evicted) = self._by_id.popitem(last=False)
+                self._email_to_id.pop(evicted['email'], None)
+        return record
+
+    def get_by_id(self, user_id, loader):
+        """
+        Return the cached record for user_id, or load and cache it.
+
+        Args:
+            user_id: The user's ID (int or numeric string, as in JWT identities)
+            loader: Called with the ID on a miss; returns a record dict or None
+
+        Returns:
+            The record dictionary, or None if the user does not exist
+        """
+        user_id = int(user_id)
+        record = self._get(user_id)
+        if record is None:
+            record = loader(user_id)
+            if record is not None:
+                self.put(record)
+        return record
+
+    def get_by_email(self, email, loader):
+        with self._lock:
+            user_id = self._email_to_id.get(email)
+        record = self._get(user_id)
+        if record is None or record['email'] != email:
+            record = loader(email)
+            if record is not None:
+                self.put(record)
+        return record
+
+    def invalidate(self, user_id):
+        with self._lock:
+            entry = self._by_id.pop(int(user_id), None)
+            if entry is not None:
+                self._email_to_id.pop(entry[1]['email'], None)
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._email_to_id.clear()
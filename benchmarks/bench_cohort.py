@@ -0,0 +1,139 @@
+# Benchmark cohort analytics over the columnar emotion store.
+#
+# Builds a synthetic store (10k patients by default, each with a random number
+# of sessions and patient utterances), then times trend, moving-average and
+# anomaly queries for a single therapist's caseload and for the whole store.
+# For reference it also times the naive approach - parsing each stored
+# emotionTimeline JSON blob and computing trends in Python - on one caseload.
+#
+# Usage:
+#   python benchmarks/bench_cohort.py --patients 10000 --output cohort.json
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+for path in (ROOT, os.path.join(ROOT, 'backend'), BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np
+
+from emotion_store import EmotionStore
+from run_benchmarks import measure, summarize
+
+
+def build_store(patients, therapists, min_sessions, max_sessions, utterances, seed):
+    rng = np.random.default_rng(seed)
+    store = EmotionStore()
+    width = len(store.labels)
+    start = np.datetime64('2024-01-01T09:00:00')
+    session_counts = rng.integers(min_sessions, max_sessions + 1, size=patients)
+    # A drift per patient so some of them genuinely trend toward an emotion
+    drift = rng.normal(0, 0.02, size=(patients, width)).astype(np.float32)
+
+    next_id = 1
+    batch = ([], [], [], [], [])
+    timelines = {}
+    for patient in range(patients):
+        therapist = patient % therapists + 1
+        base = rng.dirichlet(np.ones(width)).astype(np.float32)
+        for k in range(session_counts[patient]):
+            count = max(1, int(rng.poisson(utterances)))
+            scores = np.clip(base + drift[patient] * k + rng.normal(0, 0.05, size=(count, width)), 0, 1)
+            batch[0].append(next_id)
+            batch[1].append(patient + 1)
+            batch[2].append(therapist)
+            batch[3].append(start + np.timedelta64(int(k) * 7, 'D'))
+            batch[4].append(scores.astype(np.float32))
+            if therapist == 1:
+                timelines[next_id] = (patient + 1, json.dumps([
+                    {'label': label, 'data': scores[:, i].tolist()} for i, label in enumerate(store.labels)
+                ]))
+            next_id += 1
+        if len(batch[0]) >= 5000:
+            store.append_sessions(*batch)
+            batch = ([], [], [], [], [])
+    if batch[0]:
+        store.append_sessions(*batch)
+    return store, timelines
+
+
+def naive_trend(timelines, emotion, n):
+    """Trend computed the way it would be without the store: parse each JSON blob in Python."""
+    per_patient = {}
+    for session_id in sorted(timelines):
+        patient, blob = timelines[session_id]
+        for entry in json.loads(blob):
+            if entry['label'] == emotion:
+                data = entry['data']
+                per_patient.setdefault(patient, []).append(sum(data) / len(data) if data else 0.0)
+    slopes = {}
+    for patient, values in per_patient.items():
+        values = values[-n:]
+        if len(values) < 2:
+            continue
+        x_mean = (len(values) - 1) / 2
+        y_mean = sum(values) / len(values)
+        num = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(values))
+        den = sum((x - x_mean) ** 2 for x in range(len(values)))
+        slopes[patient] = num / den
+    return slopes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark vectorized cohort analytics')
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--therapists', type=int, default=100)
+    parser.add_argument('--min-sessions', type=int, default=4)
+    parser.add_argument('--max-sessions', type=int, default=16)
+    parser.add_argument('--utterances', type=int, default=20, help='mean patient utterances per session')
+    parser.add_argument('--emotion', default='sadness')
+    parser.add_argument('--sessions', type=int, default=8, help='sessions per patient considered by queries')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    store, timelines = build_store(args.patients, args.therapists, args.min_sessions, args.max_sessions,
+                                   args.utterances, args.seed)
+    build_seconds = time.perf_counter() - started
+    print(f"Built store: {len(store)} sessions, {len(store.scores)} utterances, "
+          f"{store.scores.nbytes / 1e6:.1f} MB of scores in {build_seconds:.2f}s", file=sys.stderr)
+
+    cases = {
+        'trend_caseload': lambda: store.trend(args.emotion, args.sessions, therapist_id=1),
+        'moving_average_caseload': lambda: store.moving_average(args.emotion, 3, args.sessions, therapist_id=1),
+        'anomalies_caseload': lambda: store.anomalies(args.emotion, args.sessions, therapist_id=1),
+        'trend_all_patients': lambda: store.trend(args.emotion, args.sessions),
+        'anomalies_all_patients': lambda: store.anomalies(args.emotion, args.sessions),
+        'naive_json_trend_caseload': lambda: naive_trend(timelines, args.emotion, args.sessions),
+    }
+    results = []
+    for name, fn in cases.items():
+        entry = {'name': name, **summarize(measure(fn, args.repeat, 1))}
+        results.append(entry)
+        print(f"{name:<28} median {entry['median_s'] * 1000:>9.2f}ms", file=sys.stderr)
+
+    report = {
+        'parameters': vars(args),
+        'sessions': len(store),
+        'utterances': int(len(store.scores)),
+        'build_seconds': build_seconds,
+        'benchmarks': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    else:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
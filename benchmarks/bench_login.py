@@ -0,0 +1,104 @@
+# Login throughput per core for different password hashing parameters.
+#
+# For each PASSWORD_HASH_METHOD, starts `workers` fresh processes (mirroring
+# gunicorn workers), each importing the backend with an in-memory database and
+# one user, and has them call POST /api/login through the Flask test client
+# for a fixed duration. Password verification dominates, so logins/s per core
+# shows what a login spike costs at each setting. --no-user-cache measures the
+# same with the user cache disabled (a database lookup per login).
+#
+# Usage:
+#   python benchmarks/bench_login.py --methods scrypt:32768:8:1,pbkdf2:sha256:260000 --workers 1,4
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+for path in (ROOT, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+DEFAULT_METHODS = 'scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:600000,pbkdf2:sha256:260000'
+EMAIL = 'bench@example.com'
+PASSWORD = 'benchmark-password'
+
+
+def _worker(method, user_cache_ttl, duration, barrier, results):
+    # Must be set before the backend (passwords.py, user_cache.py) is imported
+    os.environ['PASSWORD_HASH_METHOD'] = method
+    os.environ['USER_CACHE_TTL'] = str(user_cache_ttl)
+    from run_benchmarks import _backend_app
+    backend_app = _backend_app()
+
+    with backend_app.app.app_context():
+        user = backend_app.User(username='bench', email=EMAIL, role='patient')
+        user.set_password(PASSWORD)
+        backend_app.db.session.add(user)
+        backend_app.db.session.commit()
+
+    client = backend_app.app.test_client()
+    payload = {'email': EMAIL, 'password': PASSWORD}
+    assert client.post('/api/login', json=payload).status_code == 200  # warm-up
+    barrier.wait()
+
+    logins = 0
+    started = time.perf_counter()
+    deadline = started + duration
+    while time.perf_counter() < deadline:
+        client.post('/api/login', json=payload)
+        logins += 1
+    results.put(logins / (time.perf_counter() - started))
+
+
+def run_configuration(method, workers, user_cache_ttl, duration):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(method, user_cache_ttl, duration, barrier, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rates = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return sum(rates)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure login throughput per core for password hashing parameters')
+    parser.add_argument('--methods', default=DEFAULT_METHODS, help='comma-separated PASSWORD_HASH_METHOD values')
+    parser.add_argument('--workers', default='1', help='comma-separated worker process counts')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds to measure each configuration')
+    parser.add_argument('--no-user-cache', action='store_true', help='disable the user cache (USER_CACHE_TTL=0)')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    user_cache_ttl = 0 if args.no_user_cache else 30
+    results = []
+    print(f"Host has {cores} cores; user cache {'off' if args.no_user_cache else 'on'}", file=sys.stderr)
+    print(f"{'method':<24} {'workers':>8} {'logins/s':>10} {'per core':>10}", file=sys.stderr)
+    for method in args.methods.split(','):
+        for workers in (int(w) for w in args.workers.split(',')):
+            rate = run_configuration(method, workers, user_cache_ttl, args.duration)
+            per_core = rate / min(workers, cores)
+            results.append({'method': method, 'workers': workers, 'logins_per_second': rate,
+                            'logins_per_second_per_core': per_core})
+            print(f"{method:<24} {workers:>8} {rate:>10.1f} {per_core:>10.1f}", file=sys.stderr)
+
+    report = {'cores': cores, 'user_cache': not args.no_user_cache, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# Compare payload and in-memory sizes of emotion results.
+#
+# "top2_json" is what analyze_transcript returns today: per-utterance top-2
+# {"label", "score"} lists plus the sparse emotionTimeline. The other rows
+# keep the full 6-way distribution, as JSON lists or as the compact encoded
+# array from classification_model.encode_distributions.
+#
+# Usage:
+#   python benchmarks/bench_payload.py --utterances 50,500,2000
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+for path in (ROOT, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np
+
+from classification_model import distributions_to_bytes, encode_distributions, labels, top_emotions
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate memory of a nested Python structure."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def top2_payload(distributions):
+    """The emotions/emotionTimeline parts of today's analysis response."""
+    count = len(distributions)
+    timeline = defaultdict(lambda: [0] * count)
+    emotions = []
+    for i, row in enumerate(distributions):
+        top = top_emotions(row)
+        emotions.append([{"label": label, "score": score} for label, score in top])
+        for label, score in top:
+            timeline[label][i] = score
+    return {
+        "emotions": emotions,
+        "emotionTimeline": [{"label": label, "data": data} for label, data in timeline.items()],
+    }, timeline
+
+
+def measure(count, seed):
+    rng = np.random.default_rng(seed)
+    distributions = rng.dirichlet(np.ones(len(labels)) * 0.5, size=count).astype(np.float32)
+    payload, timeline = top2_payload(distributions)
+    full_lists = distributions.tolist()
+
+    return {
+        'utterances': count,
+        'payload_bytes': {
+            'top2_json': len(json.dumps(payload)),
+            'full_json_lists': len(json.dumps(full_lists)),
+            'full_float32_base64': len(json.dumps(encode_distributions(distributions, dtype='float32'))),
+            'full_float16_base64': len(json.dumps(encode_distributions(distributions))),
+            'full_float16_raw': len(distributions_to_bytes(distributions)),
+        },
+        'memory_bytes': {
+            'top2_python_timeline': deep_sizeof(dict(timeline)) + deep_sizeof(payload['emotions']),
+            'full_python_lists': deep_sizeof(full_lists),
+            'full_float32_array': distributions.nbytes,
+            'full_float16_array': distributions.astype(np.float16).nbytes,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare emotion payload and memory sizes')
+    parser.add_argument('--utterances', default='50,500,2000', help='comma-separated patient utterance counts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    results = [measure(int(count), args.seed) for count in args.utterances.split(',')]
+    for result in results:
+        print(f"{result['utterances']} utterances", file=sys.stderr)
+        for section in ('payload_bytes', 'memory_bytes'):
+            for name, size in result[section].items():
+                print(f"  {section:<14} {name:<22} {size:>10,}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+    else:
+        json.dump({'results': results}, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
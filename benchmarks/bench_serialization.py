@@ -0,0 +1,86 @@
+# Compare payload size and encode time of analysis response formats.
+#
+# Formats:
+#   stdlib_json       json.dumps, roughly what Flask's jsonify does today
+#   fast_json         serialization.dumps_json (orjson when installed)
+#   columnar_json     serialization.to_columnar + dumps_json
+#   columnar_msgpack  serialization.to_columnar + MessagePack (if installed)
+# Each is reported raw and gzip-compressed at the level the backend uses.
+#
+# Usage:
+#   python benchmarks/bench_serialization.py --utterances 100,1000,5000
+import argparse
+import gzip
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+for path in (ROOT, os.path.join(ROOT, 'backend'), BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import serialization
+from run_benchmarks import measure, summarize
+from synthetic import make_analysis_result, make_transcript
+
+
+def formats():
+    encoders = {
+        'stdlib_json': lambda payload: json.dumps(payload).encode('utf-8'),
+        'fast_json': serialization.dumps_json,
+        'columnar_json': lambda payload: serialization.dumps_json(serialization.to_columnar(payload)),
+    }
+    if serialization.msgpack is not None:
+        encoders['columnar_msgpack'] = lambda payload: serialization.dumps_msgpack(serialization.to_columnar(payload))
+    return encoders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare analysis response encodings')
+    parser.add_argument('--utterances', default='100,1000,5000', help='comma-separated transcript lengths')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    print(f"orjson: {'yes' if serialization.orjson else 'no'}, msgpack: {'yes' if serialization.msgpack else 'no'}",
+          file=sys.stderr)
+    results = []
+    for count in (int(c) for c in args.utterances.split(',')):
+        payload = make_analysis_result(make_transcript(count, seed=args.seed), seed=args.seed)
+        for name, encode in formats().items():
+            body = encode(payload)
+            compressed = gzip.compress(body, compresslevel=serialization.COMPRESSION_LEVEL)
+            timing = summarize(measure(lambda: encode(payload), args.repeat, 2))
+            gzip_timing = summarize(measure(
+                lambda: gzip.compress(encode(payload), compresslevel=serialization.COMPRESSION_LEVEL), args.repeat, 2))
+            results.append({
+                'utterances': count,
+                'format': name,
+                'bytes': len(body),
+                'gzip_bytes': len(compressed),
+                'encode_median_s': timing['median_s'],
+                'encode_gzip_median_s': gzip_timing['median_s'],
+            })
+            print(f"{count:>6} {name:<18} {len(body):>10,} B  gzip {len(compressed):>9,} B  "
+                  f"encode {timing['median_s'] * 1000:>7.2f}ms  +gzip {gzip_timing['median_s'] * 1000:>7.2f}ms",
+                  file=sys.stderr)
+
+    report = {
+        'orjson': serialization.orjson is not None,
+        'msgpack': serialization.msgpack is not None,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# Cold-start time and resident memory: two services vs. the combined server.
+#
+# Each mode starts in a fresh interpreter, imports its app(s), loads the models
+# it serves through model_registry and reports the wall time to ready and the
+# resident set size:
+#   backend   backend/app.py with the emotion model
+#   rag       frontend/api.py with the embedding model
+#   combined  server.py with both models
+# "backend + rag" is what running the two services as separate processes
+# costs, to compare with "combined".
+#
+# Usage:
+#   python benchmarks/bench_startup.py --repeat 3
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+
+MODES = {
+    'backend': ('app', ['emotion']),
+    'rag': ('api', ['embedding']),
+    'combined': ('server', ['emotion', 'embedding']),
+}
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def child(mode):
+    started = time.perf_counter()
+    for path in (ROOT, os.path.join(ROOT, 'backend'), os.path.join(ROOT, 'frontend'), BENCH_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark')
+    import stubs
+    stubs.install_gemini_service_stub()
+
+    module, models = MODES[mode]
+    __import__(module)
+    imported = time.perf_counter()
+    import model_registry
+    model_registry.preload(models)
+    ready = time.perf_counter()
+    print(json.dumps({
+        'mode': mode,
+        'import_s': imported - started,
+        'ready_s': ready - started,
+        'rss_bytes': rss_bytes(),
+    }))
+
+
+def run_mode(mode):
+    # Time from process start, so interpreter startup is included
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode],
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ready_s'] = time.perf_counter() - started
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare cold start and RSS of separate vs. combined services')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', choices=sorted(MODES), help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    results = {}
+    for mode in MODES:
+        runs = [run_mode(mode) for _ in range(args.repeat)]
+        results[mode] = {
+            'ready_s': statistics.median(r['process_ready_s'] for r in runs),
+            'import_s': statistics.median(r['import_s'] for r in runs),
+            'rss_bytes': statistics.median(r['rss_bytes'] for r in runs),
+        }
+    results['backend + rag'] = {
+        key: results['backend'][key] + results['rag'][key] for key in ('ready_s', 'import_s', 'rss_bytes')
+    }
+
+    for mode, result in results.items():
+        print(f"{mode:<14} ready {result['ready_s']:>7.2f}s  import {result['import_s']:>7.2f}s  "
+              f"RSS {result['rss_bytes'] / 2**20:>8.1f} MiB", file=sys.stderr)
+    separate, combined = results['backend + rag'], results['combined']
+    print(f"combined saves {(separate['rss_bytes'] - combined['rss_bytes']) / 2**20:.1f} MiB and "
+          f"{separate['ready_s'] - combined['ready_s']:.2f}s of startup CPU time", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'repeat': args.repeat, 'results': results}, f, indent=2)
+    else:
+        json.dump({'repeat': args.repeat, 'results': results}, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
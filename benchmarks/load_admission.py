@@ -0,0 +1,138 @@
+# Load test for rate limiting and admission control (rate_limit.py).
+#
+# Heavy clients, one registered user each, post long transcripts to
+# /api/analyze-transcript back to back while a probe client polls the cheap
+# GET /api/user endpoint. Reports the probe's latency percentiles and the
+# status codes the heavy clients got (200, 429 rate limited, 503 at capacity).
+# Run it once against a backend started with RATE_LIMIT_ENABLED=0 and once
+# with the defaults: with the guards on, the heavy requests are capped per
+# worker and the probe's tail latency should stay close to its idle latency.
+#
+# Usage:
+#   RATE_LIMIT_ENABLED=0 gunicorn --threads 8 --chdir backend app:app -b 127.0.0.1:5001
+#   python benchmarks/load_admission.py --url http://127.0.0.1:5001 --output off.json
+#   gunicorn --threads 8 --chdir backend app:app -b 127.0.0.1:5001
+#   python benchmarks/load_admission.py --url http://127.0.0.1:5001 --output on.json
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_sessions import percentile, register_user
+from synthetic import make_transcript
+
+
+def heavy_client(url, token, transcript, deadline, start, statuses, lock):
+    session = requests.Session()
+    session.headers['Authorization'] = f"Bearer {token}"
+    start.wait()
+    local_statuses = Counter()
+    while time.perf_counter() < deadline[0]:
+        try:
+            response = session.post(f"{url}/api/analyze-transcript", json={'transcript': transcript}, timeout=300)
+            local_statuses[str(response.status_code)] += 1
+            if response.status_code in (429, 503):
+                # A well-behaved client backs off for Retry-After (capped so the run stays short)
+                time.sleep(min(float(response.headers.get('Retry-After', 1)), 2.0))
+        except requests.exceptions.RequestException as e:
+            local_statuses[type(e).__name__] += 1
+    with lock:
+        statuses.update(local_statuses)
+
+
+def probe(url, token, interval, deadline, start, latencies, errors):
+    session = requests.Session()
+    session.headers['Authorization'] = f"Bearer {token}"
+    start.wait()
+    while time.perf_counter() < deadline[0]:
+        began = time.perf_counter()
+        try:
+            response = session.get(f"{url}/api/user", timeout=60)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - began)
+            else:
+                errors[str(response.status_code)] += 1
+        except requests.exceptions.RequestException as e:
+            errors[type(e).__name__] += 1
+        time.sleep(max(0.0, interval - (time.perf_counter() - began)))
+
+
+def probe_latencies(url, token, interval, duration):
+    """Probe latencies with no heavy load, as the baseline."""
+    latencies, errors = [], Counter()
+    start = threading.Barrier(1)
+    probe(url, token, interval, [time.perf_counter() + duration], start, latencies, errors)
+    return sorted(latencies)
+
+
+def run(url, heavy_clients, duration, utterances, interval):
+    run_id = uuid.uuid4().hex[:8]
+    probe_token = register_user(url, run_id, 'probe')
+    tokens = [register_user(url, run_id, i) for i in range(heavy_clients)]
+    transcript = make_transcript(utterance_count=utterances)
+
+    idle = probe_latencies(url, probe_token, interval, min(duration, 5))
+
+    start = threading.Barrier(heavy_clients + 2)
+    deadline = [0.0]
+    statuses, lock = Counter(), threading.Lock()
+    latencies, errors = [], Counter()
+    with ThreadPoolExecutor(max_workers=heavy_clients + 1) as pool:
+        for token in tokens:
+            pool.submit(heavy_client, url, token, transcript, deadline, start, statuses, lock)
+        pool.submit(probe, url, probe_token, interval, deadline, start, latencies, errors)
+        deadline[0] = time.perf_counter() + duration
+        start.wait()
+    latencies.sort()
+    return {
+        'heavy_clients': heavy_clients,
+        'duration_s': duration,
+        'utterances': utterances,
+        'idle_probe_p50_ms': (percentile(idle, 0.50) or 0) * 1000,
+        'idle_probe_p95_ms': (percentile(idle, 0.95) or 0) * 1000,
+        'probe_requests': len(latencies),
+        'probe_p50_ms': (percentile(latencies, 0.50) or 0) * 1000,
+        'probe_p95_ms': (percentile(latencies, 0.95) or 0) * 1000,
+        'probe_p99_ms': (percentile(latencies, 0.99) or 0) * 1000,
+        'probe_errors': dict(errors),
+        'heavy_statuses': dict(statuses),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cheap-endpoint latency under heavy /api/analyze-transcript load')
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help='backend base URL')
+    parser.add_argument('--heavy-clients', default='4,16', help='comma-separated concurrent heavy client counts')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per heavy client count')
+    parser.add_argument('--utterances', type=int, default=400, help='utterances per heavy transcript')
+    parser.add_argument('--probe-interval', type=float, default=0.1, help='seconds between probe requests')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    url = args.url.rstrip('/')
+    results = []
+    for heavy_clients in (int(c) for c in args.heavy_clients.split(',')):
+        result = run(url, heavy_clients, args.duration, args.utterances, args.probe_interval)
+        results.append(result)
+        statuses = '  '.join(f"{status}: {count}" for status, count in sorted(result['heavy_statuses'].items()))
+        print(f"{heavy_clients:>4} heavy  probe p50 {result['probe_p50_ms']:>7.1f}ms  "
+              f"p95 {result['probe_p95_ms']:>7.1f}ms  p99 {result['probe_p99_ms']:>7.1f}ms  "
+              f"(idle p95 {result['idle_probe_p95_ms']:.1f}ms)  heavy {statuses}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': url, 'results': results}, f, indent=2)
+    else:
+        json.dump({'url': url, 'results': results}, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# Load test for POST /api/chat: concurrent chat capacity per worker.
+#
+# Registers one user per client against a running backend and has every client
+# send chat messages back to back for a fixed duration. Run the backend with
+# its Gemini calls pointed at benchmarks/stub_llm.py, so each reply takes a
+# known model latency; "in flight" is then the average number of concurrent
+# chats the server sustained (throughput x stub latency). Run backend/asgi.py
+# (or the Flask app, whose chat reads GEMINI_BASE_URL too) with one worker to
+# measure the capacity of one worker.
+#
+# Usage:
+#   python benchmarks/stub_llm.py --latency-ms 800 &
+#   GEMINI_BASE_URL=http://127.0.0.1:5099 GEMINI_API_KEY=stub uvicorn asgi:app --app-dir backend --port 5001 --workers 1
+#   python benchmarks/load_chat.py --url http://127.0.0.1:5001 --clients 8,32,128 --stub-latency-ms 800
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_sessions import percentile, register_user
+
+MESSAGES = [
+    "I had a rough day at work and I can't stop thinking about it.",
+    "I tried the breathing exercise you suggested.",
+    "I feel a bit more hopeful than last week.",
+    "My sister and I argued again.",
+]
+
+
+def client(url, token, deadline, start, latencies, errors, lock):
+    session = requests.Session()
+    session.headers['Authorization'] = f"Bearer {token}"
+    start.wait()
+    local_latencies, local_errors = [], Counter()
+    turn = 0
+    while time.perf_counter() < deadline[0]:
+        began = time.perf_counter()
+        try:
+            response = session.post(f"{url}/api/chat", json={'message': MESSAGES[turn % len(MESSAGES)]}, timeout=120)
+            if response.status_code == 200:
+                local_latencies.append(time.perf_counter() - began)
+            else:
+                local_errors[f"{response.status_code}: {response.text[:80]}"] += 1
+        except requests.exceptions.RequestException as e:
+            local_errors[type(e).__name__] += 1
+        turn += 1
+    with lock:
+        latencies.extend(local_latencies)
+        errors.update(local_errors)
+
+
+def run(url, clients, duration, stub_latency):
+    run_id = uuid.uuid4().hex[:8]
+    tokens = [register_user(url, run_id, i) for i in range(clients)]
+    start = threading.Barrier(clients + 1)
+    deadline = [0.0]
+    latencies, errors, lock = [], Counter(), threading.Lock()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for token in tokens:
+            pool.submit(client, url, token, deadline, start, latencies, errors, lock)
+        deadline[0] = time.perf_counter() + duration
+        start.wait()
+    latencies.sort()
+    throughput = len(latencies) / duration
+    return {
+        'clients': clients,
+        'duration_s': duration,
+        'requests': len(latencies),
+        'throughput_rps': throughput,
+        'in_flight': throughput * stub_latency if stub_latency else None,
+        'p50_ms': (percentile(latencies, 0.50) or 0) * 1000,
+        'p95_ms': (percentile(latencies, 0.95) or 0) * 1000,
+        'p99_ms': (percentile(latencies, 0.99) or 0) * 1000,
+        'errors': dict(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent chat load test for POST /api/chat')
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help='backend base URL')
+    parser.add_argument('--clients', default='8,32,128', help='comma-separated concurrent client counts')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per client count')
+    parser.add_argument('--stub-latency-ms', type=float, default=0,
+                        help='latency the stub LLM was started with, to report chats in flight')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    url = args.url.rstrip('/')
+    stub_latency = args.stub_latency_ms / 1000.0
+    results = []
+    for clients in (int(c) for c in args.clients.split(',')):
+        result = run(url, clients, args.duration, stub_latency)
+        results.append(result)
+        in_flight = f"  in flight {result['in_flight']:>6.1f}" if result['in_flight'] is not None else ''
+        print(f"{clients:>4} clients  {result['throughput_rps']:>8.1f} req/s{in_flight}  "
+              f"p50 {result['p50_ms']:>7.1f}ms  p95 {result['p95_ms']:>7.1f}ms  "
+              f"errors {sum(result['errors'].values())}", file=sys.stderr)
+        for error, count in result['errors'].items():
+            print(f"       {count:>6} x {error}", file=sys.stderr)
+
+    report = {'url': url, 'stub_latency_ms': args.stub_latency_ms, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# Load test for POST /api/sessions with concurrent writers.
+#
+# Registers one user per writer against a running backend, then has every
+# writer create sessions as fast as it can for a fixed duration and reports
+# throughput, latency percentiles and errors (e.g. "database is locked" from
+# SQLite without WAL / busy timeout, or pool timeouts on a server database).
+#
+# Usage:
+#   python backend/app.py                      # or gunicorn -w 4 app:app
+#   python benchmarks/load_sessions.py --url http://127.0.0.1:5001 --writers 1,4,16 --duration 10
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def register_user(url, run_id, index):
+    suffix = f"{run_id}{index}"
+    response = requests.post(f"{url}/api/register", json={
+        'username': f"load{suffix}",
+        'email': f"load{suffix}@example.com",
+        'password': 'load-test-password',
+    }, timeout=30)
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+def writer(url, token, deadline, start, latencies, errors, lock):
+    session = requests.Session()
+    session.headers['Authorization'] = f"Bearer {token}"
+    start.wait()
+    local_latencies, local_errors = [], Counter()
+    while time.perf_counter() < deadline[0]:
+        began = time.perf_counter()
+        try:
+            response = session.post(f"{url}/api/sessions", json={
+                'session_type': 'load-test',
+                'duration': 30,
+                'notes': 'created by benchmarks/load_sessions.py',
+            }, timeout=60)
+            if response.status_code == 201:
+                local_latencies.append(time.perf_counter() - began)
+            else:
+                local_errors[f"{response.status_code}: {response.json().get('error', '')[:80]}"] += 1
+        except (requests.exceptions.RequestException, ValueError) as e:
+            local_errors[type(e).__name__] += 1
+    with lock:
+        latencies.extend(local_latencies)
+        errors.update(local_errors)
+
+
+def run(url, writers, duration):
+    run_id = uuid.uuid4().hex[:8]
+    tokens = [register_user(url, run_id, i) for i in range(writers)]
+    start = threading.Barrier(writers + 1)
+    deadline = [0.0]
+    latencies, errors, lock = [], Counter(), threading.Lock()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        for token in tokens:
+            pool.submit(writer, url, token, deadline, start, latencies, errors, lock)
+        deadline[0] = time.perf_counter() + duration
+        start.wait()
+    latencies.sort()
+    return {
+        'writers': writers,
+        'duration_s': duration,
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / duration,
+        'p50_ms': (percentile(latencies, 0.50) or 0) * 1000,
+        'p95_ms': (percentile(latencies, 0.95) or 0) * 1000,
+        'p99_ms': (percentile(latencies, 0.99) or 0) * 1000,
+        'errors': dict(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent writer load test for POST /api/sessions')
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help='backend base URL')
+    parser.add_argument('--writers', default='1,4,16', help='comma-separated concurrent writer counts')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per writer count')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    url = args.url.rstrip('/')
+    results = []
+    for writers in (int(w) for w in args.writers.split(',')):
+        result = run(url, writers, args.duration)
+        results.append(result)
+        print(f"{writers:>4} writers  {result['throughput_rps']:>8.1f} req/s  "
+              f"p50 {result['p50_ms']:>7.1f}ms  p95 {result['p95_ms']:>7.1f}ms  p99 {result['p99_ms']:>7.1f}ms  "
+              f"errors {sum(result['errors'].values())}", file=sys.stderr)
+        for error, count in result['errors'].items():
+            print(f"       {count:>6} x {error}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': url, 'results': results}, f, indent=2)
+    else:
+        json.dump({'url': url, 'results': results}, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+# Benchmark suite for the analysis and retrieval hot paths.
+#
+# Measures emotion/theme/distortion detection, full transcript analysis,
+# PDF text extraction, chunking, embedding and FAISS search (one document, and
+# merged across several) on synthetic inputs (see synthetic.py) with all
+# Gemini calls stubbed out (see stubs.py).
+# Results are written as JSON so runs on different commits can be compared.
+#
+# Usage:
+#   python benchmarks/run_benchmarks.py --output bench-$(git rev-parse --short HEAD).json
+#   python benchmarks/run_benchmarks.py --compare bench-main.json --fail-on-regression
+#   python benchmarks/run_benchmarks.py --only detect_emotions,chunk_text
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+for path in (ROOT, os.path.join(ROOT, 'backend'), os.path.join(ROOT, 'frontend'), BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import synthetic
+import stubs
+
+BENCHMARKS = []
+
+
+def benchmark(name, group):
+    """Register a benchmark. The decorated function receives the parsed args
+    and returns the zero-argument callable to time."""
+    def decorator(setup):
+        BENCHMARKS.append({'name': name, 'group': group, 'setup': setup})
+        return setup
+    return decorator
+
+
+_cache = {}
+
+
+def _backend_app():
+    if 'backend' not in _cache:
+        # The backend needs a database and JWT secret at import time
+        os.environ.setdefault('DATABASE_URL', 'sqlite://')
+        os.environ.setdefault('JWT_SECRET_KEY', 'benchmark')
+        stubs.install_gemini_service_stub()
+        import app as backend_app
+        stubs.stub_backend_app(backend_app)
+        _cache['backend'] = backend_app
+    return _cache['backend']
+
+
+def _rag_api():
+    if 'rag' not in _cache:
+        import api as rag_api
+        stubs.stub_rag_api(rag_api)
+        _cache['rag'] = rag_api
+    return _cache['rag']
+
+
+def _transcript(args):
+    return synthetic.make_transcript(args.utterances, args.utterance_length, seed=args.seed)
+
+
+def _patient_utterances(args):
+    return [e['utterance'] for e in _transcript(args) if e['speaker'] == 'patient']
+
+
+def _pdf_path(args):
+    if 'pdf' not in _cache:
+        path = os.path.join(tempfile.mkdtemp(prefix='mindful-bench-'), 'synthetic.pdf')
+        _cache['pdf'] = synthetic.make_pdf(path, pages=args.pdf_pages, words_per_page=args.words_per_page, seed=args.seed)
+    return _cache['pdf']
+
+
+def _document_chunks(args):
+    if 'chunks' not in _cache:
+        rag = _rag_api()
+        _cache['chunks'] = rag.chunk_text(rag.extract_text_from_pdf(_pdf_path(args)))
+    return _cache['chunks']
+
+
+def _document_index(args):
+    if 'index' not in _cache:
+        rag = _rag_api()
+        chunks = _document_chunks(args)
+        _cache['index'] = rag.create_faiss_index(rag.embed_chunks(chunks))
+    return _cache['index']
+
+
+@benchmark('detect_emotions', group='classification')
+def bench_detect_emotions(args):
+    import classification_model as cm
+    utterance = _patient_utterances(args)[0]
+    cm.load_model()
+    return lambda: cm.detect_emotions(utterance)
+
+
+@benchmark('detect_emotions_batch', group='classification')
+def bench_detect_emotions_batch(args):
+    import classification_model as cm
+    utterances = _patient_utterances(args)
+    cm.load_model()
+    return lambda: cm.detect_emotions_batch(utterances)
+
+
+@benchmark('detect_themes_and_distortions', group='classification')
+def bench_detect_rules(args):
+    import classification_model as cm
+    utterances = _patient_utterances(args)
+
+    def run():
+        for utterance in utterances:
+            cm.detect_themes(utterance)
+            cm.detect_distortions(utterance)
+    return run
+
+
+@benchmark('analyze_transcript', group='backend')
+def bench_analyze_transcript(args):
+    backend_app = _backend_app()
+    transcript = _transcript(args)
+    return lambda: backend_app.analyze_transcript_with_classification_model(transcript)
+
+
+@benchmark('extract_text_from_pdf', group='rag')
+def bench_extract_text(args):
+    rag = _rag_api()
+    path = _pdf_path(args)
+    return lambda: rag.extract_text_from_pdf(path)
+
+
+@benchmark('chunk_text', group='rag')
+def bench_chunk_text(args):
+    rag = _rag_api()
+    text = rag.extract_text_from_pdf(_pdf_path(args))
+    return lambda: rag.chunk_text(text)
+
+
+@benchmark('embed_chunks', group='rag')
+def bench_embed_chunks(args):
+    import model_registry
+    rag = _rag_api()
+    chunks = _document_chunks(args)
+
+    def run():
+        # Measure encoding, not the embedding cache
+        model_registry.embedding_cache.clear()
+        rag.embed_chunks(chunks)
+    return run
+
+
+@benchmark('embed_chunks_cached', group='rag')
+def bench_embed_chunks_cached(args):
+    rag = _rag_api()
+    chunks = _document_chunks(args)
+    rag.embed_chunks(chunks)
+    return lambda: rag.embed_chunks(chunks)
+
+
+@benchmark('faiss_search', group='rag')
+def bench_faiss_search(args):
+    import model_registry
+    rag = _rag_api()
+    chunks = _document_chunks(args)
+    index = _document_index(args)
+
+    def run():
+        model_registry.embedding_cache.clear()
+        rag.retrieve_relevant_chunks(index, "What medication is the patient taking?", chunks)
+    return run
+
+
+def _register_documents(args, count):
+    """Add `count` synthetic documents to the PDF service, reusing the cached chunks and index for the first."""
+    rag = _rag_api()
+    names = []
+    for i in range(count):
+        name = f"synthetic-{i}.pdf"
+        if name not in rag.documents:
+            if i == 0:
+                chunks, index = _document_chunks(args), _document_index(args)
+            else:
+                chunks = rag.chunk_text(synthetic.make_document_text(args.pdf_pages * args.words_per_page, seed=args.seed + i))
+                index = rag.create_faiss_index(rag.embed_chunks(chunks))
+            rag.documents[name] = {'chunks': chunks, 'index': index, 'filepath': None, 'tags': ['benchmark']}
+        names.append(name)
+    return names
+
+
+def _multi_document_search(args, count):
+    import model_registry
+    rag = _rag_api()
+    names = _register_documents(args, count)
+
+    def run():
+        model_registry.embedding_cache.clear()
+        rag.retrieve_from_documents(rag.snapshot_documents(names), "What medication is the patient taking?",
+                                    rag.MULTI_DOC_TOP_K)
+    return run
+
+
+# Latency should grow far more slowly than the number of documents searched
+@benchmark('multi_document_search_1', group='rag')
+def bench_multi_document_search_1(args):
+    return _multi_document_search(args, 1)
+
+
+@benchmark('multi_document_search_4', group='rag')
+def bench_multi_document_search_4(args):
+    return _multi_document_search(args, 4)
+
+
+@benchmark('multi_document_search_16', group='rag')
+def bench_multi_document_search_16(args):
+    return _multi_document_search(args, 16)
+
+
+def measure(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    return {
+        'runs': len(ordered),
+        'min_s': ordered[0],
+        'median_s': median,
+        'mean_s': statistics.fmean(ordered),
+        'p95_s': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'stdev_s': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'ops_per_s': 1.0 / median if median > 0 else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Return the benchmarks whose median got slower than baseline by more than threshold."""
+    previous = {r['name']: r for r in baseline.get('benchmarks', []) if 'median_s' in r}
+    regressions = []
+    print(f"\n{'benchmark':<32} {'baseline':>12} {'current':>12} {'change':>8}", file=sys.stderr)
+    for result in results:
+        if 'median_s' not in result or result['name'] not in previous:
+            continue
+        old = previous[result['name']]['median_s']
+        change = (result['median_s'] - old) / old if old else 0.0
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{result['name']:<32} {old * 1000:>10.2f}ms {result['median_s'] * 1000:>10.2f}ms {change:>+7.1%}{flag}",
+              file=sys.stderr)
+        if change > threshold:
+            regressions.append(result['name'])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the analysis and retrieval hot paths')
+    parser.add_argument('--only', help='comma-separated benchmark names or groups to run')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per benchmark')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed runs before measuring')
+    parser.add_argument('--utterances', type=int, default=40, help='utterances per synthetic transcript')
+    parser.add_argument('--utterance-length', type=int, default=12, help='words per utterance')
+    parser.add_argument('--pdf-pages', type=int, default=10, help='pages in the synthetic PDF')
+    parser.add_argument('--words-per-page', type=int, default=400, help='words per synthetic PDF page')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative median slowdown counted as a regression (default 0.10)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit non-zero on regressions')
+    args = parser.parse_args(argv)
+
+    selected = set(args.only.split(',')) if args.only else None
+    results = []
+    for bench in BENCHMARKS:
+        if selected and bench['name'] not in selected and bench['group'] not in selected:
+            continue
+        entry = {'name': bench['name'], 'group': bench['group']}
+        try:
+            fn = bench['setup'](args)
+            entry.update(summarize(measure(fn, args.repeat, args.warmup)))
+            print(f"{bench['name']:<32} median {entry['median_s'] * 1000:>9.2f}ms  p95 {entry['p95_s'] * 1000:>9.2f}ms",
+                  file=sys.stderr)
+        except ImportError as e:
+            # Missing optional dependencies skip a benchmark rather than the whole run
+            entry['skipped'] = f"missing dependency: {str(e)}"
+            print(f"{bench['name']:<32} skipped ({entry['skipped']})", file=sys.stderr)
+        results.append(entry)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {k: v for k, v in vars(args).items()
+                       if k not in ('output', 'compare', 'fail_on_regression')},
+        'benchmarks': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# Local stand-in for the Gemini generateContent REST API, for load tests.
+#
+# Answers every POST /v1beta/models/<model>:generateContent after a fixed
+# latency (plus optional jitter) with a canned reply, so the ASGI apps can be
+# load-tested against realistic model latency without an API key or quota.
+#
+# Usage:
+#   python benchmarks/stub_llm.py --port 5099 --latency-ms 800
+#   GEMINI_BASE_URL=http://127.0.0.1:5099 GEMINI_API_KEY=stub uvicorn asgi:app --app-dir backend --port 5001
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "Stub reply: thank you for sharing that. What would help you most right now?"
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.8
+    jitter = 0.0
+    lock = threading.Lock()
+    in_flight = 0
+    requests_total = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/healthz':
+            with self.lock:
+                self._send_json(200, {'in_flight': StubLLMHandler.in_flight,
+                                      'requests_total': StubLLMHandler.requests_total})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        if ':generateContent' not in self.path:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.lock:
+            StubLLMHandler.in_flight += 1
+            StubLLMHandler.requests_total += 1
+        try:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+            self._send_json(200, {'candidates': [{'content': {'role': 'model', 'parts': [{'text': REPLY}]}}]})
+        finally:
+            with self.lock:
+                StubLLMHandler.in_flight -= 1
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    # Load tests open many connections at once; the default backlog of 5 would
+    # make the stub itself the bottleneck
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a fixed-latency stub of the Gemini generateContent API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--latency-ms', type=float, default=800, help='delay before each reply')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='uniform +/- jitter added to the delay')
+    args = parser.parse_args(argv)
+
+    StubLLMHandler.latency = args.latency_ms / 1000.0
+    StubLLMHandler.jitter = args.jitter_ms / 1000.0
+    server = StubLLMServer((args.host, args.port), StubLLMHandler)
+    print(f"Stub LLM on http://{args.host}:{args.port} ({args.latency_ms:.0f}ms latency)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+# Offline stand-ins for the Gemini calls so benchmarks measure our own code
+# rather than network latency, and never need an API key.
+import sys
+import types
+
+STUB_SUMMARY = "Benchmark summary: Gemini calls are stubbed out."
+STUB_ANSWER = "Benchmark answer: Gemini calls are stubbed out."
+
+
+def install_gemini_service_stub():
+    """Register a stub gemini_service module before backend/app.py imports it."""
+    stub = types.ModuleType("gemini_service")
+    stub.setup_gemini = lambda api_key: {"stub": True}
+    stub.generate_response = lambda message, models: STUB_ANSWER
+    stub.transcribe_audio_with_gemini = lambda audio, models: {"structured_transcript": [], "transcription": ""}
+    sys.modules["gemini_service"] = stub
+    return stub
+
+
+def stub_backend_app(app_module):
+    app_module.generate_summary = lambda structured_transcript: STUB_SUMMARY
+    app_module.generate_response = lambda message, models: STUB_ANSWER
+
+
+def stub_rag_api(api_module):
+    api_module.answer_with_gemini = lambda query, context: STUB_ANSWER
@@ -0,0 +1,163 @@
+# Synthetic inputs for the benchmarks: therapy transcripts and PDFs.
+#
+# Everything is generated from a seeded RNG so runs on different commits see
+# the same inputs and their timings can be compared directly.
+import random
+from collections import defaultdict
+
+PATIENT_PHRASES = [
+    "I feel like I always mess up",
+    "I'm just tired of everything failing",
+    "Sometimes I do feel hopeful though",
+    "I couldn't sleep again last night",
+    "my sister said I was useless at the party",
+    "work has been exhausting and drained me",
+    "I never get anything right",
+    "I made some progress with the breathing exercises",
+    "nothing works no matter what I try",
+    "I was angry at my partner for no reason",
+    "I felt scared walking into the office",
+    "it surprised me how calm I was on Monday",
+    "I love spending time with my dog",
+    "I keep thinking about my own worth",
+    "things were a little better this week",
+]
+
+THERAPIST_PHRASES = [
+    "What makes you feel that way?",
+    "That's important. What gives you that hope?",
+    "How did you respond when that happened?",
+    "Can you tell me more about that moment?",
+    "What would you say to a friend in the same situation?",
+    "How has your sleep been otherwise?",
+    "Let's look at the evidence for that thought.",
+    "What did you notice in your body at the time?",
+]
+
+FILLER_WORDS = [
+    "and", "then", "really", "because", "also", "maybe", "today", "again",
+    "when", "after", "before", "honestly", "lately", "somehow", "still",
+]
+
+DOCUMENT_WORDS = [
+    "patient", "reports", "history", "anxiety", "depressive", "episodes", "sleep",
+    "medication", "therapy", "session", "goals", "progress", "family", "support",
+    "symptoms", "assessment", "plan", "follow-up", "cognitive", "behavioral",
+    "mood", "stable", "intake", "discharge", "summary", "recommend", "weekly",
+]
+
+
+def make_utterance(rng, base_phrases, length):
+    words = rng.choice(base_phrases).rstrip("?.").split()
+    while len(words) < length:
+        words.append(rng.choice(FILLER_WORDS))
+    return " ".join(words[:max(length, 1)]) + "."
+
+
+def make_transcript(utterance_count=40, utterance_length=12, patient_ratio=0.6, seed=0):
+    """
+    Build a structured transcript in the format analyze_transcript expects.
+
+    Args:
+        utterance_count: Total number of utterances (both speakers)
+        utterance_length: Approximate number of words per utterance
+        patient_ratio: Fraction of utterances spoken by the patient
+        seed: RNG seed, so the same arguments always give the same transcript
+
+    Returns:
+        List of {"speaker", "utterance"} dictionaries
+    """
+    rng = random.Random(seed)
+    transcript = []
+    for _ in range(utterance_count):
+        if rng.random() < patient_ratio:
+            transcript.append({"speaker": "patient",
+                               "utterance": make_utterance(rng, PATIENT_PHRASES, utterance_length)})
+        else:
+            transcript.append({"speaker": "therapist",
+                               "utterance": make_utterance(rng, THERAPIST_PHRASES, utterance_length)})
+    return transcript
+
+
+def make_document_text(word_count=5000, seed=0):
+    rng = random.Random(seed)
+    sentences = []
+    remaining = word_count
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(DOCUMENT_WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+def make_pdf(path, pages=10, words_per_page=400, seed=0):
+    """Write a synthetic clinical-notes style PDF to path and return the path."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for page_number in range(pages):
+        text = make_document_text(words_per_page, seed=seed + page_number)
+        page = doc.new_page()
+        # Wrap the text into the page rectangle, leaving a margin
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+EMOTION_LABELS = ['sadness', 'joy', 'love', 'anger', 'fear', 'surprise']
+
+
+def make_analysis_result(transcript, seed=0):
+    """
+    Build a response shaped like analyze_transcript_with_classification_model's,
+    with random top-2 emotions instead of model output, so serialization can be
+    benchmarked without loading the model.
+    """
+    rng = random.Random(seed)
+    patient_count = sum(1 for entry in transcript if entry['speaker'] == 'patient')
+    emotion_timeline = defaultdict(lambda: [0] * patient_count)
+    themes_summary = defaultdict(int)
+    distortion_summary = defaultdict(int)
+    analyzed = []
+    patient_idx = 0
+    for i, entry in enumerate(transcript):
+        emotions, themes, distortions = [], [], []
+        if entry['speaker'] == 'patient':
+            first, second = rng.sample(EMOTION_LABELS, 2)
+            top = rng.uniform(0.4, 0.99)
+            emotions = [{"label": first, "score": top}, {"label": second, "score": rng.uniform(0, 1 - top)}]
+            for emotion in emotions:
+                emotion_timeline[emotion["label"]][patient_idx] = emotion["score"]
+            if rng.random() < 0.3:
+                themes = [rng.choice(["self-esteem", "hope", "fatigue"])]
+            if rng.random() < 0.2:
+                distortions = [rng.choice(["overgeneralization", "catastrophizing"])]
+            for theme in themes:
+                themes_summary[theme] += 1
+            for distortion in distortions:
+                distortion_summary[distortion] += 1
+            patient_idx += 1
+        analyzed.append({
+            "index": i,
+            "speaker": entry['speaker'],
+            "utterance": entry['utterance'],
+            "emotions": emotions,
+            "themes": themes,
+            "distortions": distortions
+        })
+    return {
+        "sessionMeta": {
+            "sessionId": "session-bench",
+            "patientId": "patient-bench",
+            "date": "2025-05-01",
+            "summary": "Benchmark summary."
+        },
+        "transcript": analyzed,
+        "emotionTimeline": [{"label": label, "data": data} for label, data in emotion_timeline.items()],
+        "themesSummary": dict(themes_summary),
+        "distortionSummary": dict(distortion_summary),
+        "structured_transcript": transcript,
+        "transcription": "\n".join(f"{e['speaker'].capitalize()}: {e['utterance']}" for e in transcript)
+    }
@@ -0,0 +1,116 @@
+# Sweep worker-process counts against torch thread counts for the transcript
+# analysis workload and report the throughput-optimal setting for this host.
+#
+# Each configuration starts `workers` fresh processes (mirroring gunicorn
+# workers), pins TORCH_NUM_THREADS / TORCH_NUM_INTEROP_THREADS in each one,
+# and has them analyze transcripts concurrently for a fixed duration.
+#
+# Usage:
+#   python benchmarks/tune_threads.py --workers 1,2,4 --threads 1,2,4 --duration 10
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+for path in (ROOT, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def _parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def _build_transcript(utterance_count, utterance_length):
+    from synthetic import make_transcript
+    transcript = make_transcript(utterance_count, utterance_length, patient_ratio=1.0)
+    return [e['utterance'] for e in transcript]
+
+
+def _worker(threads, interop_threads, utterances, duration, barrier, results):
+    # Must be set before classification_model (and torch) is imported
+    os.environ['TORCH_NUM_THREADS'] = str(threads)
+    os.environ['TORCH_NUM_INTEROP_THREADS'] = str(interop_threads)
+    import classification_model as cm
+
+    cm.load_model()
+    cm.detect_emotions_batch(utterances)  # warm-up
+    barrier.wait()
+
+    processed = 0
+    started = time.perf_counter()
+    deadline = started + duration
+    while time.perf_counter() < deadline:
+        cm.detect_emotions_batch(utterances)
+        for utterance in utterances:
+            cm.detect_themes(utterance)
+            cm.detect_distortions(utterance)
+        processed += len(utterances)
+    results.put(processed / (time.perf_counter() - started))
+
+
+def run_configuration(workers, threads, interop_threads, utterances, duration):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(threads, interop_threads, utterances, duration, barrier, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    rates = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return sum(rates)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find the throughput-optimal worker and thread counts for transcript analysis')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker process counts')
+    parser.add_argument('--threads', default='1,2,4', help='comma-separated intra-op thread counts per worker')
+    parser.add_argument('--interop-threads', type=int, default=1, help='inter-op threads per worker')
+    parser.add_argument('--utterances', type=int, default=40, help='patient utterances per transcript')
+    parser.add_argument('--utterance-length', type=int, default=12, help='words per utterance')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to measure each configuration')
+    parser.add_argument('--allow-oversubscription', action='store_true',
+                        help='also try configurations where workers * threads exceeds the core count')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    utterances = _build_transcript(args.utterances, args.utterance_length)
+    results = []
+    print(f"Host has {cores} cores; {args.utterances} utterances per transcript, {args.duration}s per configuration")
+    print(f"{'workers':>8} {'threads':>8} {'utterances/s':>14}")
+    for workers in _parse_int_list(args.workers):
+        for threads in _parse_int_list(args.threads):
+            if workers * threads > cores and not args.allow_oversubscription:
+                continue
+            rate = run_configuration(workers, threads, args.interop_threads, utterances, args.duration)
+            results.append({'workers': workers, 'threads': threads,
+                            'interop_threads': args.interop_threads, 'utterances_per_second': rate})
+            print(f"{workers:>8} {threads:>8} {rate:>14.1f}")
+
+    if not results:
+        print("No configurations to run - try --allow-oversubscription")
+        return 1
+
+    best = max(results, key=lambda r: r['utterances_per_second'])
+    print(f"\nBest: {best['workers']} workers x {best['threads']} threads "
+          f"({best['utterances_per_second']:.1f} utterances/s)")
+    print(f"  TORCH_NUM_THREADS={best['threads']} TORCH_NUM_INTEROP_THREADS={best['interop_threads']} "
+          f"gunicorn --workers {best['workers']} ...")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'cores': cores, 'results': results, 'best': best}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
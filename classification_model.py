@@ -3,19 +3,59 @@ from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 import torch.nn.functional as F
 import json
+import base64
+import numpy as np
 from collections import defaultdict
 import requests
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Load model and tokenizer
+# CPU threading for inference. Each worker process should get its own share of
+# the cores, otherwise several workers running PyTorch defaults oversubscribe
+# the machine. Use benchmarks/tune_threads.py to find good values for a host.
+TORCH_NUM_THREADS = os.getenv("TORCH_NUM_THREADS")
+TORCH_NUM_INTEROP_THREADS = os.getenv("TORCH_NUM_INTEROP_THREADS")
+
+def configure_torch_threads(num_threads=None, num_interop_threads=None):
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(int(num_interop_threads))
+        except RuntimeError as e:
+            # Inter-op threads can only be set before any parallel work has started
+            print(f"Could not set inter-op threads: {str(e)}")
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+configure_torch_threads(TORCH_NUM_THREADS, TORCH_NUM_INTEROP_THREADS)
+
+# Utterances per forward pass, shared with the inference sidecar. Padding a
+# whole transcript to its longest utterance in one pass wastes compute and
+# memory; chunks keep both bounded.
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "32"))
+
+# Model and tokenizer are loaded lazily so that processes which only use the
+# keyword rules (or talk to the inference server) don't pay for a BERT copy
 model_name = "nateraw/bert-base-uncased-emotion"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSequenceClassification.from_pretrained(model_name)
+tokenizer = None
+model = None
 labels = ['sadness', 'joy', 'love', 'anger', 'fear', 'surprise']
+_model_lock = threading.Lock()
+
+def load_model():
+    global tokenizer, model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                tokenizer = AutoTokenizer.from_pretrained(model_name)
+                loaded = AutoModelForSequenceClassification.from_pretrained(model_name)
+                loaded.eval()
+                model = loaded
+    return tokenizer, model
 
 # Example session data for testing
 session_transcript = [
@@ -28,12 +68,54 @@ session_transcript = [
 
 # Emotion detection function
 def detect_emotions(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True)
+    return detect_emotions_batch([text])[0]
+
+# Batched emotion detection - one forward pass per batch_size utterances
+def detect_emotions_batch(texts):
+    return [top_emotions(row) for row in detect_emotion_distributions(texts)]
+
+# Full 6-way softmax distribution per utterance, columns ordered as `labels`
+def detect_emotion_distributions(texts, batch_size=INFERENCE_MAX_BATCH_SIZE):
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, len(labels)), dtype=np.float32)
+    tokenizer, model = load_model()
+    chunks = []
     with torch.no_grad():
-        outputs = model(**inputs)
-        probs = F.softmax(outputs.logits, dim=1)
-        top_probs, top_label_idx = torch.topk(probs, k=2)
-        return [(labels[i], float(top_probs[0][j])) for j, i in enumerate(top_label_idx[0])]
+        for start in range(0, len(texts), batch_size):
+            inputs = tokenizer(texts[start:start + batch_size], return_tensors="pt", truncation=True, padding=True)
+            outputs = model(**inputs)
+            chunks.append(F.softmax(outputs.logits, dim=1).numpy())
+    return np.concatenate(chunks).astype(np.float32, copy=False)
+
+# Top-k (label, score) pairs from one distribution row, highest first
+def top_emotions(distribution, k=2):
+    top_idx = np.argsort(distribution)[::-1][:k]
+    return [(labels[i], float(distribution[i])) for i in top_idx]
+
+# Compact binary form of an (utterances x labels) distribution matrix.
+# float16 keeps ~3 significant digits, which is plenty for probabilities and
+# halves the size again compared to float32.
+def encode_distributions(distributions, dtype="float16"):
+    data = distributions_to_bytes(distributions, dtype)
+    return {
+        "labels": labels,
+        "dtype": dtype,
+        "shape": [len(distributions), len(labels)],
+        "data": base64.b64encode(data).decode("ascii")
+    }
+
+def decode_distributions(payload):
+    dtype = np.dtype(payload["dtype"]).newbyteorder("<")
+    array = np.frombuffer(base64.b64decode(payload["data"]), dtype=dtype)
+    return array.reshape(payload["shape"]).astype(np.float32)
+
+def distributions_to_bytes(distributions, dtype="float16"):
+    return np.ascontiguousarray(distributions, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+
+def distributions_from_bytes(data, dtype="float16"):
+    array = np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder("<"))
+    return array.reshape(-1, len(labels)).astype(np.float32)
 
 # Theme and distortion rules
 theme_keywords = {
@@ -53,6 +135,24 @@ def detect_themes(text):
 def detect_distortions(text):
     return [distortion for distortion, cues in cognitive_rules.items() if any(cue in text.lower() for cue in cues)]
 
+SUMMARY_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "topP": 0.8,
+    "topK": 40,
+    "maxOutputTokens": 1024
+}
+
+def build_summary_prompt(structured_transcript):
+    return f"""
+    Summarize the patient's emotional and thematic journey based on this dialogue:
+    
+    {json.dumps(structured_transcript, indent=2)}
+    
+    Give insights that could help a therapist understand the patient's emotional patterns.
+    Provide Time Series Insights on the patient's emotional journey.
+    Provide tips/ways to help the patient improve their emotional state.
+    """
+
 # Function to generate summary via Gemini
 def generate_summary(structured_transcript):
     # Get API key from environment variable    
@@ -62,15 +162,7 @@ def generate_summary(structured_transcript):
     
     API_KEY = os.getenv("API_KEY")
     GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={API_KEY}"
-    summary_prompt = f"""
-    Summarize the patient's emotional and thematic journey based on this dialogue:
-    
-    {json.dumps(structured_transcript, indent=2)}
-    
-    Give insights that could help a therapist understand the patient's emotional patterns.
-    Provide Time Series Insights on the patient's emotional journey.
-    Provide tips/ways to help the patient improve their emotional state.
-    """
+    summary_prompt = build_summary_prompt(structured_transcript)
     
     payload = {
         "contents": [
@@ -79,12 +171,7 @@ def generate_summary(structured_transcript):
                 "parts": [{"text": summary_prompt}]
             }
         ],
-        "generationConfig": {
-            "temperature": 0.7,
-            "topP": 0.8,
-            "topK": 40,
-            "maxOutputTokens": 1024
-        }
+        "generationConfig": SUMMARY_GENERATION_CONFIG
     }
     headers = {"Content-Type": "application/json"}
     
@@ -0,0 +1,190 @@
+# Upload handling and file serving shared by both Flask apps.
+#
+# - werkzeug parses and spools the whole multipart body the first time
+#   request.form / request.files is touched, so upload routes call
+#   limit_request_body() first with their own limit: bodies declaring a larger
+#   Content-Length are refused (413) before any of it is read, and on Flask
+#   3.1+ chunked bodies are cut off once they pass it. MAX_CONTENT_LENGTH is
+#   the same cap for every other route. save_upload then copies the file to
+#   disk in chunks and enforces the exact per-file limit.
+# - Files are served with send_from_directory, which hands the open file to
+#   the server's wsgi.file_wrapper (sendfile under gunicorn) or, with
+#   USE_X_SENDFILE, to the front proxy. Responses are conditional: strong
+#   ETags, Last-Modified, If-None-Match / If-Modified-Since and Range requests.
+# - Profile pictures get resized thumbnails once at upload time (Pillow,
+#   optional); uploaded names are unique, so they are served as immutable.
+import logging
+import os
+
+from flask import jsonify, request, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
+
+try:
+    from PIL import Image, UnidentifiedImageError
+except ImportError:
+    Image = None
+
+MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(64 * 1024 * 1024)))
+MAX_PROFILE_PICTURE_BYTES = int(os.getenv('MAX_PROFILE_PICTURE_BYTES', str(5 * 1024 * 1024)))
+MAX_PDF_BYTES = int(os.getenv('MAX_PDF_BYTES', str(50 * 1024 * 1024)))
+PROFILE_THUMBNAIL_SIZES = [int(size) for size in os.getenv('PROFILE_THUMBNAIL_SIZES', '64,256').split(',') if size.strip()]
+UPLOAD_CACHE_MAX_AGE = int(os.getenv('UPLOAD_CACHE_MAX_AGE', str(365 * 24 * 3600)))  # seconds
+USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() in ('1', 'true', 'yes')
+
+ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+COPY_CHUNK_SIZE = 64 * 1024
+UPLOAD_FORM_OVERHEAD = 64 * 1024  # multipart boundaries and small form fields next to the file
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    pass
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+def _too_large(max_bytes):
+    return UploadTooLarge(f'File is larger than {max_bytes // (1024 * 1024)} MB')
+
+
+def limit_request_body(max_bytes):
+    """
+    Cap the current request's body for an upload of at most max_bytes.
+
+    Must be called before request.form or request.files is accessed.
+
+    Raises:
+        UploadTooLarge: If the declared Content-Length is already over the cap
+    """
+    limit = max_bytes + UPLOAD_FORM_OVERHEAD
+    if request.content_length is not None and request.content_length > limit:
+        raise _too_large(max_bytes)
+    try:
+        # Flask 3.1+: also enforced while reading bodies without a Content-Length
+        request.max_content_length = limit
+    except AttributeError:
+        pass
+
+
+def save_upload(file_storage, path, max_bytes, digest=None):
+    """
+    Copy an uploaded file to path in chunks, enforcing a size limit.
+
+    Args:
+        file_storage: werkzeug FileStorage from request.files
+        path: Destination path
+        max_bytes: Largest accepted size; larger uploads are removed and rejected
+        digest: Optional hashlib object updated with each chunk, so the file
+            can be hashed without reading it back
+
+    Returns:
+        Number of bytes written
+
+    Raises:
+        UploadTooLarge: If the upload exceeds max_bytes
+    """
+    written = 0
+    try:
+        with open(path, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise _too_large(max_bytes)
+                out.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return written
+
+
+def thumbnail_name(filename, size):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_{size}{ext}"
+
+
+def make_thumbnails(path, sizes=PROFILE_THUMBNAIL_SIZES):
+    """
+    Check that path is an image and write a thumbnail next to it per size.
+
+    Without Pillow no thumbnails are made and the original is served for
+    every size.
+
+    Raises:
+        InvalidUpload: If the file is not a readable image
+    """
+    if Image is None:
+        return []
+    folder, filename = os.path.split(path)
+    created = []
+    try:
+        with Image.open(path) as image:
+            image.load()
+            for size in sizes:
+                thumb = image.copy()
+                thumb.thumbnail((size, size))
+                thumb_path = os.path.join(folder, thumbnail_name(filename, size))
+                thumb.save(thumb_path, format=image.format)
+                created.append(thumb_path)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        for thumb_path in created:
+            os.remove(thumb_path)
+        # The error names the upload's path on disk, so it is logged rather than returned
+        logger.info(f"Rejected profile picture {filename}: {str(e)}")
+        raise InvalidUpload('Not a valid image')
+    return created
+
+
+def save_profile_picture(file_storage, folder, filename):
+    """Save an uploaded profile picture and its thumbnails; raises UploadTooLarge or InvalidUpload."""
+    if os.path.splitext(filename)[1].lower() not in ALLOWED_IMAGE_EXTENSIONS:
+        raise InvalidUpload('Unsupported image type')
+    path = os.path.join(folder, filename)
+    save_upload(file_storage, path, MAX_PROFILE_PICTURE_BYTES)
+    try:
+        make_thumbnails(path)
+    except InvalidUpload:
+        os.remove(path)
+        raise
+    return path
+
+
+def remove_profile_picture(folder, filename):
+    for name in [filename] + [thumbnail_name(filename, size) for size in PROFILE_THUMBNAIL_SIZES]:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def send_upload(folder, filename, size=None):
+    """
+    Serve an uploaded file (or its thumbnail for the requested size).
+
+    Uploaded names are unique and never rewritten, so responses may be cached
+    for UPLOAD_CACHE_MAX_AGE and marked immutable.
+    """
+    if size is not None:
+        fitting = [s for s in sorted(PROFILE_THUMBNAIL_SIZES) if s >= size]
+        if fitting and os.path.exists(os.path.join(folder, thumbnail_name(filename, fitting[0]))):
+            filename = thumbnail_name(filename, fitting[0])
+    response = send_from_directory(folder, filename, conditional=True, etag=True, max_age=UPLOAD_CACHE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    app.config['USE_X_SENDFILE'] = USE_X_SENDFILE
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def _request_too_large(e):
+        return jsonify({'error': e.description or 'Upload is too large'}), 413
@@ -1,15 +1,29 @@
 from flask import Flask, request, jsonify, make_response
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
 import os
+import sys
 from dotenv import load_dotenv
 import fitz  # PyMuPDF
 import faiss
 import google.generativeai as genai
 from typing import List
-from sentence_transformers import SentenceTransformer
+from functools import partial
 import numpy as np
 
+# Shared helpers (observability, ...) live at the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import observability
+import profiling
+import model_registry
+import file_serving
+import rate_limit
+from observability import span
+
 app = Flask(__name__)
+logger = observability.init_app(app, 'rag')
+profiling.init_app(app, logger)
+file_serving.init_app(app)
 # Configure CORS with all options enabled
 CORS(app, 
      resources={r"/*": {
@@ -35,17 +49,23 @@ GEMINI_API_KEY=os.getenv("API_KEY")
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel("gemini-1.5-pro")
 
-# Load embedding model (local)
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# The embedding model (local) is loaded on first use and shared through model_registry
 
 # Create uploads directory if it doesn't exist
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# Dictionary to store document data
+# Dictionary to store document data, keyed by document ID (the uploaded file name)
 documents = {}
 
+# Chunks put in the prompt when a question spans one document / several
+ASK_TOP_K = int(os.getenv('ASK_TOP_K', '3'))
+MULTI_DOC_TOP_K = int(os.getenv('MULTI_DOC_TOP_K', '6'))
+# Fraction of a chunk's word 3-grams found in an already selected chunk above
+# which it is dropped as a duplicate (e.g. notes copied into a discharge summary)
+DEDUPE_OVERLAP = float(os.getenv('DEDUPE_OVERLAP', '0.8'))
+
 def extract_text_from_pdf(pdf_path: str) -> str:
     doc = fitz.open(pdf_path)
     text = ""
@@ -62,7 +82,7 @@ def chunk_text(text: str, max_tokens: int = 300) -> List[str]:
     return chunks
 
 def embed_chunks(chunks: List[str]) -> np.ndarray:
-    return embedding_model.encode(chunks, convert_to_numpy=True)
+    return model_registry.embed(chunks)
 
 def create_faiss_index(vectors: np.ndarray):
     index = faiss.IndexFlatL2(vectors.shape[1])
@@ -70,12 +90,12 @@ def create_faiss_index(vectors: np.ndarray):
     return index
 
 def retrieve_relevant_chunks(index, query: str, chunks: List[str], k: int = 3):
-    query_vec = embedding_model.encode([query])
-    D, I = index.search(np.array(query_vec), k)
+    query_vec = model_registry.embed([query])
+    D, I = index.search(query_vec, k)
     return [chunks[i] for i in I[0]]
 
-def answer_with_gemini(query: str, context: str) -> str:
-    prompt = f"""
+def build_answer_prompt(query: str, context: str) -> str:
+    return f"""
 You're a helpful assistant. Use the following context to answer the user's question:
 
 Context:
@@ -86,88 +106,255 @@ Question:
 
 Answer:
 """
+
+def answer_with_gemini(query: str, context: str) -> str:
+    prompt = build_answer_prompt(query, context)
     response = model.generate_content(prompt)
     return response.text.strip()
 
+def parse_tags(value) -> List[str]:
+    """Tags from a comma-separated string or a list, trimmed and lower-cased; raises ValueError otherwise."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise ValueError('tags must be a comma-separated string or a list')
+    return sorted({str(tag).strip().lower() for tag in value if str(tag).strip()})
+
+def parse_question(data):
+    """
+    Validate an ask-question request body.
+    
+    The documents to search are given by 'document_ids' and/or 'tags' (any
+    document with one of the tags), or by a single 'pdf_name'.
+    
+    Returns:
+        (question, list of document IDs, number of chunks for the prompt)
+    
+    Raises:
+        ValueError: If the question or the documents are missing
+        LookupError: If a document ID has not been uploaded
+    """
+    if not isinstance(data, dict) or not data.get('question'):
+        raise ValueError('Missing question')
+    if not isinstance(data['question'], str):
+        raise ValueError('question must be a string')
+    document_ids = data.get('document_ids') or ([data['pdf_name']] if data.get('pdf_name') else [])
+    if isinstance(document_ids, str):
+        document_ids = [document_ids]
+    if not isinstance(document_ids, list) or not all(isinstance(doc_id, str) for doc_id in document_ids):
+        raise ValueError('document_ids must be a list of document ID strings')
+    tags = parse_tags(data.get('tags'))
+    if not document_ids and not tags:
+        raise ValueError('Missing PDF name, document IDs or tags')
+    
+    missing = [doc_id for doc_id in document_ids if doc_id not in documents]
+    if missing:
+        raise LookupError(f"PDF not found. Please upload it first: {', '.join(missing)}")
+    names = list(dict.fromkeys(document_ids))
+    # Snapshot: uploads may add documents from other threads meanwhile
+    names += [name for name, doc in list(documents.items()) if name not in names and set(tags) & set(doc['tags'])]
+    if not names:
+        raise LookupError(f"No uploaded documents are tagged {', '.join(tags)}")
+    return data['question'], names, ASK_TOP_K if len(names) == 1 else MULTI_DOC_TOP_K
+
+def snapshot_documents(names: List[str]):
+    """
+    The current data of each named document, taken once per question.
+    
+    A re-upload replaces documents[name], and chunk positions found in one
+    version's index only match that version's chunks, so searching, merging
+    and building the context must all use the same snapshot.
+    
+    Returns:
+        {document ID: {'chunks', 'index', ...}} in the order of names
+    
+    Raises:
+        LookupError: If a document is not uploaded
+    """
+    docs = {}
+    for name in names:
+        doc = documents.get(name)
+        if doc is None:
+            raise LookupError(f"PDF not found. Please upload it first: {name}")
+        docs[name] = doc
+    return docs
+
+def search_document(name: str, doc, query_vec: np.ndarray, k: int):
+    """
+    Nearest chunks of one document to an embedded query.
+    
+    Twice k candidates are returned so that k remain after deduplication.
+    
+    Args:
+        name: Document ID
+        doc: The document's entry from snapshot_documents
+    
+    Returns:
+        List of (distance, document ID, chunk position)
+    """
+    index = doc['index']
+    if not index.ntotal:
+        return []
+    D, I = index.search(query_vec, min(2 * k, index.ntotal))
+    return [(float(d), name, int(i)) for d, i in zip(D[0], I[0]) if i >= 0]
+
+def _shingles(text: str, size: int = 3):
+    words = text.lower().split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def merge_results(results, docs, k: int, overlap: float = DEDUPE_OVERLAP):
+    """
+    Merge per-document hits by distance, skipping chunks that overlap a kept one.
+    
+    All indexes hold embeddings from the same model, so L2 distances are
+    comparable across documents.
+    
+    Args:
+        results: One list of (distance, document ID, chunk position) per document
+        docs: The snapshot the results were searched in (snapshot_documents)
+        k: Number of chunks to keep
+        overlap: Shared fraction of word 3-grams (of the shorter chunk) at which
+            two chunks count as duplicates
+    
+    Returns:
+        Up to k (distance, document ID, chunk position), nearest first
+    """
+    kept, kept_shingles = [], []
+    for hit in sorted(hit for hits in results for hit in hits):
+        shingles = _shingles(docs[hit[1]]['chunks'][hit[2]])
+        if any(len(shingles & other) >= overlap * min(len(shingles), len(other)) for other in kept_shingles):
+            continue
+        kept.append(hit)
+        kept_shingles.append(shingles)
+        if len(kept) == k:
+            break
+    return kept
+
+def retrieve_from_documents(docs, query: str, k: int):
+    """
+    Search several documents for a query and merge the results.
+    
+    The query is embedded once and the documents' indexes are searched in
+    parallel on the shared model thread pool, so latency grows far more
+    slowly than the number of documents.
+    
+    Args:
+        docs: Documents to search, from snapshot_documents
+    
+    Returns:
+        Up to k (distance, document ID, chunk position), nearest first
+    """
+    query_vec = model_registry.embed([query])
+    if len(docs) == 1:
+        [(name, doc)] = docs.items()
+        results = [search_document(name, doc, query_vec, k)]
+    else:
+        results = list(model_registry.executor().map(partial(search_document, query_vec=query_vec, k=k),
+                                                     docs.keys(), docs.values()))
+    return merge_results(results, docs, k)
+
+def build_context(hits, docs) -> str:
+    """Prompt context from merged hits; with several documents each chunk is labelled with its source."""
+    if len({name for _, name, _ in hits}) <= 1:
+        return "\n".join(docs[name]['chunks'][position] for _, name, position in hits)
+    return "\n\n".join(f"[{name}]\n{docs[name]['chunks'][position]}" for _, name, position in hits)
+
+def describe_sources(hits):
+    return [{'document': name, 'chunk': position, 'distance': distance} for distance, name, position in hits]
+
+def process_pdf(filepath: str):
+    with span('extract'):
+        full_text = extract_text_from_pdf(filepath)
+    
+    with span('chunk'):
+        chunks = chunk_text(full_text)
+    
+    with span('embed'):
+        vectors = embed_chunks(chunks)
+    
+    with span('index'):
+        index = create_faiss_index(vectors)
+    return chunks, index
+
 @app.route('/api/upload-pdf', methods=['POST'])
 def upload_pdf():
-    print("Received upload request")
+    # Refuse oversized bodies before werkzeug parses and spools them
+    file_serving.limit_request_body(file_serving.MAX_PDF_BYTES)
     if 'pdf' not in request.files:
-        print("No file part in request")
         return jsonify({'error': 'No file part'}), 400
     
     file = request.files['pdf']
     
     if file.filename == '':
-        print("No selected file")
         return jsonify({'error': 'No selected file'}), 400
     
     if file and file.filename.endswith('.pdf'):
-        # Save the file
-        filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filepath)
-        print(f"File saved to {filepath}")
+        # Stream the file to disk, rejecting it once it passes MAX_PDF_BYTES
+        # and hashing it as it is written
+        filepath = os.path.join(UPLOAD_FOLDER, secure_filename(file.filename))
+        digest = model_registry.content_hasher()
+        with span('save'):
+            file_serving.save_upload(file, filepath, file_serving.MAX_PDF_BYTES, digest=digest)
         
         # Process the PDF
         try:
-            print(f"[1] Extracting text from {file.filename}...")
-            full_text = extract_text_from_pdf(filepath)
-            
-            print("[2] Chunking text...")
-            chunks = chunk_text(full_text)
-            
-            print("[3] Generating embeddings...")
-            vectors = embed_chunks(chunks)
-            
-            print("[4] Creating FAISS index...")
-            index = create_faiss_index(vectors)
+            # Identical files share one processed index
+            key = digest.hexdigest()
+            chunks, index = model_registry.cached_index(key, lambda: process_pdf(filepath))
             
             # Store document data for later use
             documents[file.filename] = {
                 'chunks': chunks,
                 'index': index,
-                'filepath': filepath
+                'filepath': filepath,
+                'tags': parse_tags(request.form.get('tags'))
             }
             
             return jsonify({
                 'message': 'PDF uploaded and processed successfully',
-                'filename': file.filename
+                'filename': file.filename,
+                'tags': documents[file.filename]['tags']
             }), 200
             
         except Exception as e:
-            print(f"Error processing PDF: {str(e)}")
+            logger.exception(f"Error processing PDF: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
-    print("Invalid file type")
     return jsonify({'error': 'Invalid file type. Please upload a PDF.'}), 400
 
+@app.route('/api/documents', methods=['GET'])
+def list_documents():
+    tags = set(parse_tags(request.args.get('tags')))
+    return jsonify({'documents': [
+        {'id': name, 'tags': doc['tags'], 'chunks': len(doc['chunks'])}
+        for name, doc in list(documents.items()) if not tags or tags & set(doc['tags'])
+    ]}), 200
+
 @app.route('/api/ask-question', methods=['POST'])
+@rate_limit.limit('ask', key=rate_limit.ip_key)  # no accounts here
 def ask_question():
-    data = request.json
-    
-    if not data or 'question' not in data or 'pdf_name' not in data:
-        return jsonify({'error': 'Missing question or PDF name'}), 400
-    
-    question = data['question']
-    pdf_name = data['pdf_name']
-    
-    if pdf_name not in documents:
-        return jsonify({'error': 'PDF not found. Please upload it first.'}), 404
+    try:
+        question, names, k = parse_question(request.json)
+        docs = snapshot_documents(names)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     
     try:
-        # Retrieve document data
-        doc_data = documents[pdf_name]
-        
-        print("[5] Retrieving relevant chunks...")
-        top_chunks = retrieve_relevant_chunks(doc_data['index'], question, doc_data['chunks'])
+        with span('search'):
+            hits = retrieve_from_documents(docs, question, k)
         
-        print("[6] Generating answer using Gemini...")
-        context = "\n".join(top_chunks)
-        answer = answer_with_gemini(question, context)
+        context = build_context(hits, docs)
+        with span('generate'):
+            answer = answer_with_gemini(question, context)
         
-        return jsonify({'answer': answer}), 200
+        return jsonify({'answer': answer, 'documents': names, 'sources': describe_sources(hits)}), 200
         
     except Exception as e:
+        logger.exception(f"Error answering question: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,103 @@
+# ASGI entry point for the PDF question-answering service.
+#
+#   uvicorn asgi:app --app-dir frontend --port 5000
+#
+# /api/ask-question is served by an async handler: the query embedding and
+# the FAISS searches of the selected documents run concurrently on the shared
+# model thread pool (MODEL_POOL_WORKERS) and the Gemini call goes through
+# llm_client's shared async HTTP client. Uploads and every other route are
+# served by the Flask app, mounted through WSGIMiddleware.
+# The handler keeps the Flask route's rate limit and concurrency cap (rate_limit).
+#
+# Requires starlette, uvicorn and httpx (a2wsgi is used when installed).
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import api as flask_rag  # also puts the repository root on sys.path
+import llm_client
+import model_registry
+import rate_limit
+
+logger = flask_rag.logger
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run CPU-bound work (embedding, search) on the shared model thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(model_registry.executor(), partial(fn, *args, **kwargs))
+
+
+def client_key(request):
+    return f"ip:{request.client.host if request.client else None}"
+
+
+def rejection_response(body, status, headers):
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+@rate_limit.limit_async('ask', client_key, rejection_response)
+async def ask_question(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    try:
+        question, names, k = flask_rag.parse_question(data)
+        docs = flask_rag.snapshot_documents(names)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except LookupError as e:
+        return JSONResponse({'error': str(e)}, status_code=404)
+
+    try:
+        # Embed the question once, then search every selected document concurrently
+        query_vec = await run_cpu(model_registry.embed, [question])
+        results = await asyncio.gather(*(run_cpu(flask_rag.search_document, name, doc, query_vec, k)
+                                         for name, doc in docs.items()))
+        hits = await run_cpu(flask_rag.merge_results, results, docs, k)
+        context = flask_rag.build_context(hits, docs)
+        answer = await llm_client.generate(flask_rag.build_answer_prompt(question, context))
+        return JSONResponse({'answer': answer.strip(), 'documents': names,
+                             'sources': flask_rag.describe_sources(hits)})
+    except Exception as e:
+        logger.exception(f"Error answering question: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await llm_client.close()
+
+
+def create_app(flask_app=flask_rag.app):
+    return Starlette(
+        routes=[
+            Route('/api/ask-question', ask_question, methods=['POST']),
+            Mount('/', app=WSGIMiddleware(flask_app)),
+        ],
+        middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_credentials=True,
+                               allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+                               allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'])],
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,111 @@
+# Client for the Gemini generateContent REST API, used by the ASGI apps.
+#
+# One shared httpx.AsyncClient keeps connections to the API open, so an event
+# loop can have many slow generation calls in flight without holding a thread
+# for each. generate_sync() is the blocking equivalent for code that already
+# runs on a worker thread, such as background chat summaries. GEMINI_BASE_URL
+# can point at a compatible local server, e.g. benchmarks/stub_llm.py for load
+# tests.
+import os
+
+import httpx
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("API_KEY")
+GEMINI_CHAT_MODEL = os.getenv("GEMINI_CHAT_MODEL", "gemini-1.5-pro")
+GEMINI_SUMMARY_MODEL = os.getenv("GEMINI_SUMMARY_MODEL", "gemini-1.5-flash")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+
+
+class LLMError(Exception):
+    pass
+
+
+_client = None
+_sync_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=GEMINI_BASE_URL,
+            timeout=LLM_TIMEOUT,
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+def get_sync_client():
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = httpx.Client(base_url=GEMINI_BASE_URL, timeout=LLM_TIMEOUT)
+    return _sync_client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def is_configured():
+    return bool(GEMINI_API_KEY)
+
+
+def extract_text(response_data):
+    try:
+        return response_data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        message = response_data.get("error", {}).get("message") if isinstance(response_data, dict) else None
+        raise LLMError(message or "Unexpected response from Gemini API")
+
+
+def _request(prompt, model, generation_config, system_instruction):
+    payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if system_instruction:
+        payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    return {"url": f"/v1beta/models/{model}:generateContent", "params": {"key": GEMINI_API_KEY}, "json": payload}
+
+
+def _response_text(response):
+    if response.status_code != 200:
+        raise LLMError(f"Gemini API status code: {response.status_code}")
+    return extract_text(response.json())
+
+
+async def generate(prompt, model=GEMINI_CHAT_MODEL, generation_config=None, system_instruction=None):
+    """
+    Generate text for a single-turn prompt.
+
+    Args:
+        prompt: The prompt text
+        model: Gemini model name
+        generation_config: Optional generationConfig dictionary
+        system_instruction: Optional standing instructions for the model
+
+    Returns:
+        The generated text
+
+    Raises:
+        LLMError: If the API is unreachable or returns an error
+    """
+    try:
+        response = await get_client().post(**_request(prompt, model, generation_config, system_instruction))
+    except httpx.HTTPError as e:
+        raise LLMError(f"Could not reach Gemini API: {str(e)}") from e
+    return _response_text(response)
+
+
+def generate_sync(prompt, model=GEMINI_CHAT_MODEL, generation_config=None, system_instruction=None):
+    """Blocking generate(), for worker threads. Raises LLMError the same way."""
+    try:
+        response = get_sync_client().post(**_request(prompt, model, generation_config, system_instruction))
+    except httpx.HTTPError as e:
+        raise LLMError(f"Could not reach Gemini API: {str(e)}") from e
+    return _response_text(response)
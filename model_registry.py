@@ -0,0 +1,160 @@
+# Process-wide registry of the heavy models and the compute shared by the apps.
+#
+# Both services used to load their own models at import time: BERT for the
+# backend's emotion classifier and a SentenceTransformer for the PDF service.
+# Here each model is loaded lazily, once per process, on first use, and every
+# app in the process (backend, PDF service, the combined server.py) shares:
+#   - the models themselves (get / preload)
+#   - one bounded thread pool for CPU-bound inference (executor)
+#   - an LRU cache of text embeddings, so repeated chunks and queries are
+#     encoded once (embed)
+#   - an LRU cache of built document indexes keyed by content hash, so
+#     re-uploading the same PDF skips extraction and embedding (cached_index)
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '50000'))  # vectors
+INDEX_CACHE_SIZE = int(os.getenv('INDEX_CACHE_SIZE', '64'))  # documents
+MODEL_POOL_WORKERS = int(os.getenv('MODEL_POOL_WORKERS', str(os.cpu_count() or 1)))
+PRELOAD_MODELS = [name.strip() for name in os.getenv('PRELOAD_MODELS', '').split(',') if name.strip()]
+
+_loaders = {}
+_models = {}
+_models_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def register(name, loader):
+    """Register a zero-argument loader for a model; it runs on the first get(name)."""
+    _loaders[name] = loader
+
+
+def get(name):
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = _loaders[name]()
+    return model
+
+
+def loaded():
+    return sorted(_models)
+
+
+def preload(names=None):
+    for name in (PRELOAD_MODELS if names is None else names):
+        get(name)
+
+
+def executor():
+    """The shared thread pool for CPU-bound inference."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MODEL_POOL_WORKERS, thread_name_prefix='model')
+    return _executor
+
+
+def _load_emotion_model():
+    import classification_model
+    return classification_model.load_model()
+
+
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+register('emotion', _load_emotion_model)
+register('embedding', _load_embedding_model)
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+index_cache = LRUCache(INDEX_CACHE_SIZE)
+
+
+def _text_key(text):
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def embed(texts):
+    """
+    Embed texts with the shared SentenceTransformer, reusing cached vectors.
+
+    Args:
+        texts: List of strings
+
+    Returns:
+        (texts x dimensions) float32 array
+    """
+    keys = [_text_key(text) for text in texts]
+    vectors = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        encoded = get('embedding').encode([texts[i] for i in missing], convert_to_numpy=True)
+        for i, vector in zip(missing, encoded):
+            vectors[i] = vector.astype(np.float32, copy=False)
+            embedding_cache.put(keys[i], vectors[i])
+    if not vectors:
+        return np.zeros((0, get('embedding').get_sentence_embedding_dimension()), dtype=np.float32)
+    return np.stack(vectors)
+
+
+def content_hasher():
+    """Incremental hash for content read in chunks; its hexdigest() equals content_key(data)."""
+    return hashlib.sha256()
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cached_index(key, build):
+    """Return the cached value for a document key, building and caching it on a miss."""
+    value = index_cache.get(key)
+    if value is None:
+        value = build()
+        index_cache.put(key, value)
+    return value
@@ -0,0 +1,203 @@
+# Shared request instrumentation for the backend and PDF/RAG Flask apps.
+#
+# - span(stage): times one stage of a request (decode, transcribe, classify,
+#   summarize, extract, embed, search, generate, ...) into a histogram and
+#   attaches it to the request's Server-Timing header and completion log line.
+# - init_app(app, service): records request latency/count per route and adds a
+#   Prometheus text-format /metrics endpoint.
+# - setup_logging(): routes log records through a QueueHandler so formatting
+#   and writing happen on a background thread instead of the request thread.
+#
+# Metrics are kept in-process, so with several gunicorn workers each worker
+# reports its own numbers; scrape them per worker or run a single worker.
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+
+# Latency buckets in seconds, covering fast DB routes up to multi-minute transcriptions
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+_logging_listener = None
+_logging_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Append fields passed via ``extra=`` to the message as JSON."""
+
+    def format(self, record):
+        message = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+        if fields:
+            message = f"{message} {json.dumps(fields, default=str)}"
+        return message
+
+
+def setup_logging(name, level=None):
+    """Return a logger whose records are written by a background listener thread."""
+    global _logging_listener
+    with _logging_lock:
+        if _logging_listener is None:
+            log_queue = queue.SimpleQueue()
+            handler = logging.StreamHandler()
+            handler.setFormatter(StructuredFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+            _logging_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+            _logging_listener.start()
+            atexit.register(_logging_listener.stop)
+
+            root = logging.getLogger()
+            root.addHandler(logging.handlers.QueueHandler(log_queue))
+            root.setLevel(level or os.getenv('LOG_LEVEL', 'INFO'))
+    return logging.getLogger(name)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+    return '{' + inner + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = list(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for upper, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', upper),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route')
+REQUEST_COUNT = Counter('http_requests_total', 'Requests by route and status code')
+STAGE_LATENCY = Histogram('stage_duration_seconds', 'Latency of individual request stages')
+STAGE_ERRORS = Counter('stage_errors_total', 'Request stages that raised an exception')
+
+METRICS = [REQUEST_LATENCY, REQUEST_COUNT, STAGE_LATENCY, STAGE_ERRORS]
+
+
+def register_metric(metric):
+    """Expose an additional Counter/Histogram on /metrics."""
+    METRICS.append(metric)
+    return metric
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _current_service():
+    return current_app.config.get('SERVICE_NAME', 'app') if has_app_context() else 'app'
+
+
+@contextmanager
+def span(stage):
+    """Time a stage of the current request, e.g. ``with span('classify'): ...``"""
+    service = _current_service()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(service=service, stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.observe(elapsed, service=service, stage=stage)
+        if has_request_context():
+            g.setdefault('spans', []).append((stage, elapsed))
+
+
+def init_app(app, service):
+    app.config['SERVICE_NAME'] = service
+    logger = setup_logging(service)
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(elapsed, service=service, method=request.method, route=route)
+        REQUEST_COUNT.inc(service=service, method=request.method, route=route, status=response.status_code)
+
+        spans = g.pop('spans', [])
+        if spans:
+            response.headers['Server-Timing'] = ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in spans)
+        if route != '/metrics':
+            logger.info('request completed', extra={
+                'route': route,
+                'method': request.method,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 1),
+                'spans': {stage: round(seconds * 1000, 1) for stage, seconds in spans},
+            })
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    return logger
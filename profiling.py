@@ -0,0 +1,163 @@
+# Opt-in per-request profiling for the backend and PDF/RAG Flask apps.
+#
+# A request is profiled with cProfile when either
+#   - it carries an "X-Profile-Token" header matching PROFILE_ADMIN_TOKEN, or
+#   - it is picked by random sampling at PROFILE_SAMPLE_RATE (0.0 - 1.0).
+# Each profile is written to PROFILE_DIR as <name>.prof (pstats format, open
+# with snakeviz or `python -m pstats`) plus <name>.json with the route and
+# timing. The most recent PROFILE_MAX_FILES profiles are kept.
+#
+# Admin endpoints (require the X-Profile-Token header):
+#   GET /api/profiles                  list recent profiles
+#   GET /api/profiles/<name>           download the .prof file
+#   GET /api/profiles/<name>?format=text   top functions by cumulative time
+import cProfile
+import datetime
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+
+from flask import Response, g, jsonify, request, send_from_directory
+
+PROFILE_ADMIN_TOKEN = os.getenv('PROFILE_ADMIN_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.path.abspath(os.getenv('PROFILE_DIR', 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+# Routes that are never profiled: the profile endpoints themselves and scrapes
+_EXCLUDED_PREFIXES = ('/api/profiles', '/metrics')
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+def is_admin_request():
+    token = request.headers.get(PROFILE_HEADER)
+    return bool(PROFILE_ADMIN_TOKEN and token and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN))
+
+
+def _profile_trigger():
+    if request.method == 'OPTIONS' or request.path.startswith(_EXCLUDED_PREFIXES):
+        return None
+    if is_admin_request():
+        return 'header'
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+def _route_slug():
+    route = request.url_rule.rule if request.url_rule else request.path
+    return re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+
+
+def _prune_profiles():
+    metas = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith('.json'))
+    excess = len(metas) - PROFILE_MAX_FILES
+    for meta in metas[:max(excess, 0)]:
+        for ext in ('.json', '.prof'):
+            path = os.path.join(PROFILE_DIR, meta[:-len('.json')] + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _save_profile(profiler, trigger, elapsed, status):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    now = datetime.datetime.utcnow()
+    duration_ms = round(elapsed * 1000, 1)
+    # Timestamp first so names sort chronologically
+    name = f"{now.strftime('%Y%m%dT%H%M%S')}-{_route_slug()}-{int(duration_ms)}ms-{uuid.uuid4().hex[:6]}"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}.prof"))
+    meta = {
+        'name': name,
+        'route': request.url_rule.rule if request.url_rule else None,
+        'path': request.path,
+        'method': request.method,
+        'status': status,
+        'duration_ms': duration_ms,
+        'trigger': trigger,
+        'created_at': now.isoformat() + 'Z',
+    }
+    with open(os.path.join(PROFILE_DIR, f"{name}.json"), 'w') as f:
+        json.dump(meta, f)
+    _prune_profiles()
+    return name
+
+
+def _stop_profiler():
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    return profiler
+
+
+def init_app(app, logger=None):
+    @app.before_request
+    def _start_profiler():
+        trigger = _profile_trigger()
+        if trigger is None:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter
+            return
+        g.profiler = profiler
+        g.profile_trigger = trigger
+        g.profile_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_profiler(response):
+        profiler = _stop_profiler()
+        if profiler is None:
+            return response
+        elapsed = time.perf_counter() - g.pop('profile_started')
+        try:
+            name = _save_profile(profiler, g.pop('profile_trigger'), elapsed, response.status_code)
+            response.headers['X-Profile-Name'] = name
+        except OSError as e:
+            if logger:
+                logger.warning(f"Could not save profile: {str(e)}")
+        return response
+
+    @app.teardown_request
+    def _disable_profiler(exc):
+        # after_request doesn't run for unhandled exceptions
+        _stop_profiler()
+
+    @app.route('/api/profiles', methods=['GET'])
+    def list_profiles():
+        if not is_admin_request():
+            return jsonify({'error': 'Forbidden'}), 403
+        limit = request.args.get('limit', 50, type=int)
+        if not os.path.isdir(PROFILE_DIR):
+            return jsonify([]), 200
+        profiles = []
+        for meta_file in sorted((f for f in os.listdir(PROFILE_DIR) if f.endswith('.json')), reverse=True)[:limit]:
+            try:
+                with open(os.path.join(PROFILE_DIR, meta_file)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return jsonify(profiles), 200
+
+    @app.route('/api/profiles/<name>', methods=['GET'])
+    def get_profile(name):
+        if not is_admin_request():
+            return jsonify({'error': 'Forbidden'}), 403
+        if not _NAME_PATTERN.match(name) or not os.path.exists(os.path.join(PROFILE_DIR, f"{name}.prof")):
+            return jsonify({'error': 'Profile not found'}), 404
+        if request.args.get('format') == 'text':
+            out = io.StringIO()
+            stats = pstats.Stats(os.path.join(PROFILE_DIR, f"{name}.prof"), stream=out)
+            stats.sort_stats('cumulative').print_stats(request.args.get('limit', 50, type=int))
+            return Response(out.getvalue(), mimetype='text/plain')
+        return send_from_directory(PROFILE_DIR, f"{name}.prof", as_attachment=True)
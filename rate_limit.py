@@ -0,0 +1,350 @@
+# Rate limiting and admission control for the expensive AI endpoints.
+#
+# Two independent guards per route name ('chat', 'transcribe', 'analyze',
+# 'ask'):
+#   - a token bucket per client (JWT user, or remote address for anonymous
+#     callers) that refills at RATE_LIMIT_<NAME>_PER_MINUTE with bursts of up
+#     to RATE_LIMIT_<NAME>_BURST; over the limit the request is rejected with
+#     429 and a Retry-After of when the next token is available
+#   - an admission controller per worker that runs at most
+#     MAX_CONCURRENT_<NAME> requests at once, lets up to ADMISSION_QUEUE_SIZE
+#     more wait for ADMISSION_QUEUE_TIMEOUT seconds, and rejects the rest with
+#     503 and Retry-After, so heavy requests can't occupy every worker thread
+#     and starve cheap endpoints such as /api/user (async handlers are
+#     admitted only while a slot is free; they never wait for one)
+#
+# Buckets are kept in memory per process by default. With
+# RATE_LIMIT_SQLITE_PATH set they are kept in a SQLite file instead, so all
+# workers on a host share one budget per client.
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import partial, wraps
+
+from flask import jsonify, request
+
+from observability import Counter, register_metric
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+RATE_LIMIT_SQLITE_CLEANUP_INTERVAL = float(os.getenv('RATE_LIMIT_SQLITE_CLEANUP_INTERVAL', '60'))  # seconds
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '4'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '2'))  # seconds
+MAX_RETRY_AFTER = 3600  # seconds; a route limited to 0 per minute never refills
+
+# name: (requests per minute, burst, max concurrent per worker)
+DEFAULT_LIMITS = {
+    'chat': (20, 5, 8),
+    'transcribe': (6, 2, 2),
+    'analyze': (10, 3, 2),
+    'ask': (20, 5, 4),
+}
+
+RATE_LIMITED = register_metric(Counter('rate_limited_total', 'Requests rejected by the per-client rate limit'))
+ADMISSION_REJECTED = register_metric(Counter('admission_rejected_total', 'Requests rejected because the route was at capacity'))
+
+
+def route_limits(name):
+    """(refill rate per second, burst, max concurrent) for a route name."""
+    per_minute, burst, concurrent = DEFAULT_LIMITS[name]
+    prefix = name.upper()
+    return (float(os.getenv(f'RATE_LIMIT_{prefix}_PER_MINUTE', per_minute)) / 60.0,
+            int(os.getenv(f'RATE_LIMIT_{prefix}_BURST', burst)),
+            int(os.getenv(f'MAX_CONCURRENT_{prefix}', concurrent)))
+
+
+LIMITS = {name: route_limits(name) for name in DEFAULT_LIMITS}
+
+
+def _take(tokens, updated, now, rate, burst, cost):
+    """
+    Refill a bucket to `now` and try to take `cost` tokens.
+
+    Returns:
+        (allowed, remaining tokens, seconds until `cost` tokens are available)
+    """
+    tokens = burst if tokens is None else min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate if rate > 0 else float('inf')
+
+
+class MemoryBucketStore:
+    """
+    Buckets in process memory, capped at max_keys.
+
+    Past the cap the least recently seen client's bucket is dropped, which at
+    worst gives that client a fresh burst; memory stays bounded however many
+    distinct keys are seen.
+    """
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated), least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, now))
+            allowed, tokens, retry_after = _take(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class SQLiteBucketStore:
+    """
+    Buckets in a SQLite file, shared by all worker processes on the host.
+
+    Every cleanup_interval seconds each process deletes the buckets that have
+    refilled completely, so the table only holds recently active clients.
+    """
+
+    def __init__(self, path, cleanup_interval=RATE_LIMIT_SQLITE_CLEANUP_INTERVAL):
+        self.path = path
+        self.cleanup_interval = cleanup_interval
+        self._next_cleanup = time.time() + cleanup_interval
+        self._cleanup_lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS token_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                     'updated REAL NOT NULL, full_at REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS token_buckets_full_at ON token_buckets (full_at)')
+
+    def _connection(self):
+        # One connection per thread, and never one inherited from a parent process
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def take(self, key, rate, burst, cost=1):
+        conn = self._connection()
+        now = time.time()  # wall clock, comparable across processes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM token_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (None, now)
+            allowed, tokens, retry_after = _take(tokens, updated, now, rate, burst, cost)
+            full_at = now + (burst - tokens) / rate if rate > 0 else float('inf')
+            conn.execute('INSERT OR REPLACE INTO token_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                         (key, tokens, now, full_at))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if now >= self._next_cleanup:
+            self.cleanup(now)
+        return allowed, retry_after
+
+    def cleanup(self, now=None):
+        """Delete buckets that have refilled completely; they are equivalent to missing ones."""
+        now = time.time() if now is None else now
+        if not self._cleanup_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._next_cleanup = now + self.cleanup_interval
+            return self._connection().execute('DELETE FROM token_buckets WHERE full_at <= ?', (now,)).rowcount
+        finally:
+            self._cleanup_lock.release()
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a short, bounded wait.
+
+    acquire() admits immediately while fewer than max_concurrent requests are
+    running, waits up to queue_timeout when at most queue_size others are
+    already waiting, and otherwise returns False at once.
+    """
+
+    def __init__(self, max_concurrent, queue_size=ADMISSION_QUEUE_SIZE, queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_service_time = 1.0  # seconds, moving average
+        self._condition = threading.Condition()
+
+    def try_acquire(self):
+        with self._condition:
+            if self.in_flight < self.max_concurrent:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._condition:
+            if self.in_flight < self.max_concurrent:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self.in_flight < self.max_concurrent, self.queue_timeout)
+                if admitted:
+                    self.in_flight += 1
+                return admitted
+            finally:
+                self.waiting -= 1
+
+    def release(self, service_time=None):
+        with self._condition:
+            self.in_flight -= 1
+            if service_time is not None:
+                self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+            self._condition.notify()
+
+    def retry_after(self):
+        # Roughly when the requests ahead of a new one will have finished
+        with self._condition:
+            return self.avg_service_time * (self.waiting + 1) / max(self.max_concurrent, 1)
+
+
+store = SQLiteBucketStore(RATE_LIMIT_SQLITE_PATH) if RATE_LIMIT_SQLITE_PATH else MemoryBucketStore()
+controllers = {name: AdmissionController(max_concurrent) for name, (_, _, max_concurrent) in LIMITS.items()}
+
+
+def check_rate(name, client):
+    """
+    Take one token from the client's bucket for a route.
+
+    Returns:
+        None if the request may proceed, else the Retry-After in seconds
+    """
+    rate, burst, _ = LIMITS[name]
+    allowed, retry_after = store.take(f"{name}:{client}", rate, burst)
+    if allowed:
+        return None
+    RATE_LIMITED.inc(route=name)
+    return retry_after
+
+
+def rejection(status, message, retry_after):
+    """JSON body and headers for a 429/503 rejection."""
+    return {'error': message}, status, {'Retry-After': str(max(1, math.ceil(min(retry_after, MAX_RETRY_AFTER))))}
+
+
+def too_many_requests(retry_after):
+    return rejection(429, 'Too many requests. Please slow down and try again shortly.', retry_after)
+
+
+def at_capacity(name):
+    ADMISSION_REJECTED.inc(route=name)
+    return rejection(503, 'The service is busy. Please try again shortly.', controllers[name].retry_after())
+
+
+def ip_key():
+    """The remote address, for apps without accounts."""
+    return f"ip:{request.remote_addr}"
+
+
+def client_key():
+    """
+    The JWT identity when the request carries a valid token, else the remote
+    address. Needs a JWTManager on the app; use ip_key for apps without one.
+    """
+    from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+    from flask_jwt_extended.exceptions import JWTExtendedException
+    from jwt.exceptions import PyJWTError
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        # The view rejects the bad token itself; limit the attempt by address
+        return ip_key()
+    identity = get_jwt_identity()
+    return f"user:{identity}" if identity is not None else ip_key()
+
+
+def admit(name, client):
+    """
+    Rate-limit a request and admit it only if the route has a free slot now.
+
+    For async handlers, which must not block the event loop waiting for one.
+
+    Returns:
+        None if admitted (call controllers[name].release() when done), else
+        the (body, status, headers) rejection
+    """
+    retry_after = check_rate(name, client)
+    if retry_after is not None:
+        return too_many_requests(retry_after)
+    if not controllers[name].try_acquire():
+        return at_capacity(name)
+    return None
+
+
+def limit_async(name, client_of, respond):
+    """
+    Guard an async (ASGI) handler like limit() guards a Flask view.
+
+    Args:
+        name: Route name in LIMITS
+        client_of: Function of the request returning its client key
+        respond: Function (body, status, headers) -> response
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request):
+            if not RATE_LIMIT_ENABLED:
+                return await handler(request)
+            if isinstance(store, SQLiteBucketStore):
+                # Taking a token may wait for the SQLite write lock; keep that off the event loop
+                rejected = await asyncio.get_running_loop().run_in_executor(
+                    None, partial(admit, name, client_of(request)))
+            else:
+                rejected = admit(name, client_of(request))
+            if rejected is not None:
+                return respond(*rejected)
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                controllers[name].release(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def limit(name, key=client_key):
+    """
+    Guard a Flask view with the rate limit and admission controller for `name`.
+
+    Place it below @jwt_required() so the client is keyed by user. `key`
+    returns the client key for the current request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return view(*args, **kwargs)
+            retry_after = check_rate(name, key())
+            if retry_after is not None:
+                body, status, headers = too_many_requests(retry_after)
+                return jsonify(body), status, headers
+            controller = controllers[name]
+            if not controller.acquire():
+                body, status, headers = at_capacity(name)
+                return jsonify(body), status, headers
+            started = time.perf_counter()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controller.release(time.perf_counter() - started)
+        return wrapper
+    return decorator
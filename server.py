@@ -0,0 +1,73 @@
+# Combined single-process deployment of the backend API and the PDF service.
+#
+#   python server.py                     # development server on SERVER_PORT (5001)
+#   gunicorn --threads 8 server:app      # production
+#
+# Both Flask apps are imported into one process, so they share one Python and
+# PyTorch runtime, one copy of each model and one inference thread pool and
+# embedding/index cache (model_registry), instead of two processes each
+# paying for their own. Requests for routes the PDF service defines go to it;
+# everything else, including the routes both apps define (/metrics, which
+# already covers both services, and /api/profiles), goes to the backend.
+#
+# PRELOAD_MODELS=emotion,embedding loads the models at startup instead of on
+# the first request that needs them.
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for path in (os.path.join(ROOT, 'backend'), os.path.join(ROOT, 'frontend')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from werkzeug.exceptions import HTTPException, MethodNotAllowed
+
+import model_registry
+from app import app as backend_app, logger
+from api import app as rag_app
+
+SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '5001'))
+
+
+def shared_routes(primary, secondary):
+    """Rules defined by both apps; these are served by the primary app."""
+    return {rule.rule for rule in primary.url_map.iter_rules()} & {rule.rule for rule in secondary.url_map.iter_rules()}
+
+
+class RouteDispatcher:
+    """
+    WSGI app that sends each request to the secondary app when its URL map
+    matches the path (other than shared routes and static files), and to the
+    primary app otherwise. Both apps keep their own CORS handling and error
+    handlers.
+    """
+
+    def __init__(self, primary, secondary):
+        self.primary = primary
+        self.secondary = secondary
+        self.shared = shared_routes(primary, secondary)
+
+    def select(self, environ):
+        try:
+            rule, _ = self.secondary.url_map.bind_to_environ(environ).match(return_rule=True)
+        except MethodNotAllowed:
+            # The path is the secondary app's, so let it answer 405
+            return self.secondary
+        except HTTPException:
+            return self.primary
+        if rule.rule in self.shared or rule.endpoint == 'static':
+            return self.primary
+        return self.secondary
+
+    def __call__(self, environ, start_response):
+        return self.select(environ)(environ, start_response)
+
+
+app = RouteDispatcher(backend_app, rag_app)
+logger.info(f"Combined server: routes served by the backend for both apps: {sorted(app.shared)}")
+model_registry.preload()
+
+if __name__ == '__main__':
+    from werkzeug.serving import run_simple
+    run_simple(SERVER_HOST, SERVER_PORT, app, threaded=True)